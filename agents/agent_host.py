@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Run many arena agents from one process.
+
+Usage:
+  python agents/agent_host.py --agents alpha,beta,gamma
+  python agents/agent_host.py --prefix host-bot- --count 50
+
+Each agent keeps its own credentials file (<--credential-dir>/<name>.json,
+same format as daemon_agent.py) and runs the daemon's agent and game loops.
+All /agents/wait and /games/:id/wait long-polls share one asyncio event
+loop and one pool of keep-alive connections. Turn decisions (choose_move,
+swap and offer10 scoring) run on a bounded pool of --search-threads
+threads; time spent queued for a thread is taken off the turn clock. The
+threads share the GIL, so more than one trades search depth for shorter
+queues; PARALLEL_WORKERS is what spreads a search over cores. Pondering
+(PONDER=1) runs on the same threads and gives way to every turn decision,
+so it only uses threads that would otherwise be idle. Every other
+setting (search engine, budgets, opening book) comes from the same
+environment variables as daemon_agent.py.
+
+Needs a server with /agents/wait; the daemon's /agents/active-game fallback
+for older servers is not ported.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import http.client
+import os
+import ssl
+import time
+
+import daemon_agent as agent
+
+DEFAULT_CREDENTIAL_DIR = os.path.join(os.path.dirname(agent.CREDENTIAL_PATH), "host")
+
+
+class AsyncHttpPool(agent.HttpPool):
+    """HttpPool on asyncio streams: keep-alive HTTP/1.1 connections for the event loop.
+
+    Same pooling, stale-connection retry and per-endpoint counters as the
+    daemon's pool; request() is a coroutine and a connection is a
+    (reader, writer) pair.
+    """
+
+    STALE_ERRORS = agent.HttpPool.STALE_ERRORS + (asyncio.IncompleteReadError,)
+
+    async def request(self, method, path, body, headers, timeout):
+        """Send one request and return (status, body text); network errors raise."""
+        try:
+            return await asyncio.wait_for(self._exchange(method, path, body, headers), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("timed out") from None
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for _, writer in idle:
+            writer.close()
+
+    async def _exchange(self, method, path, body, headers):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        reused = conn is not None
+        if conn is None:
+            conn = await self._open()
+        try:
+            try:
+                status, raw, keep_alive = await self._roundtrip(conn, method, path, body, headers)
+            except self.STALE_ERRORS:
+                if not reused:
+                    raise
+                conn[1].close()
+                self.reconnects += 1
+                conn = await self._open()
+                status, raw, keep_alive = await self._roundtrip(conn, method, path, body, headers)
+        except BaseException:
+            conn[1].close()
+            raise
+        if keep_alive:
+            with self.lock:
+                if len(self.idle) < self.max_idle:
+                    self.idle.append(conn)
+                    return status, raw
+        conn[1].close()
+        return status, raw
+
+    async def _open(self):
+        self.connects += 1
+        port = self.port or (443 if self.https else 80)
+        context = ssl.create_default_context() if self.https else None
+        return await asyncio.open_connection(self.host, port, ssl=context)
+
+    async def _roundtrip(self, conn, method, path, body, headers):
+        reader, writer = conn
+        host = self.host if self.port is None else f"{self.host}:{self.port}"
+        lines = [f"{method} {self.prefix + path} HTTP/1.1", f"Host: {host}", "Accept-Encoding: identity"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body or b'')}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        parts = status_line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            raise http.client.BadStatusLine(status_line.decode("latin-1").strip())
+        version, status = parts[0], int(parts[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        connection = response_headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if "chunked" in response_headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            raw = b"".join(chunks)
+        elif "content-length" in response_headers:
+            raw = await reader.readexactly(int(response_headers["content-length"]))
+        elif status in (204, 304) or 100 <= status < 200 or method == "HEAD":
+            raw = b""
+        else:
+            raw = await reader.read()
+            keep_alive = False
+        return status, raw.decode("utf-8"), keep_alive
+
+
+class AgentHost:
+    """Runs the agent and game loops of many agents as tasks on one event loop."""
+
+    def __init__(self, names, credential_dir, search_threads):
+        self.names = names
+        self.credential_dir = credential_dir
+        self.pool = AsyncHttpPool(max_idle=max(agent.HTTP_POOL_SIZE, len(names)))
+        if agent.get_root_pool() is not None and search_threads > 1:
+            # RootPool already spreads one search over PARALLEL_WORKERS processes
+            # and is not safe to drive from two threads at once.
+            print(f"PARALLEL_WORKERS={agent.PARALLEL_WORKERS}: using one search thread")
+            search_threads = 1
+        self.search_threads = search_threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=search_threads, thread_name_prefix="search"
+        )
+        self.turns = 0
+        self.queued_ms = 0.0
+        self.pondering = set()
+
+    async def http(self, method, path, token=None, payload=None, timeout=30):
+        """http_json over the shared async pool; same (status, dict) contract."""
+        body, headers = agent.json_request(token, payload)
+        started = time.perf_counter()
+        try:
+            status, raw = await self.pool.request(method, path, body, headers, timeout)
+            data = agent.json_response(status, raw)
+        except Exception as e:  # noqa: BLE001
+            status, data = 0, {"error": str(e)}
+        self.pool.record(agent.endpoint_label(method, path), (time.perf_counter() - started) * 1000.0, status)
+        return status, data
+
+    async def run(self):
+        book = agent.get_opening_book()
+        if book is not None:
+            print(f"opening book: {book.count} positions")
+        print(f"hosting {len(self.names)} agents, {self.search_threads} search threads")
+        try:
+            await asyncio.gather(*(self.run_agent(name) for name in self.names))
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.pool.close()
+
+    async def plan_turn(self, game, agent_id, state):
+        """agent.plan_turn on the search pool, with the queueing delay charged to the clock."""
+        queued = time.perf_counter()
+        left_ms = agent.turn_time_left_ms(game)
+
+        def job():
+            waited_ms = (time.perf_counter() - queued) * 1000.0
+            self.queued_ms += waited_ms
+            clock = agent.TimeManager(None if left_ms is None else max(0.0, left_ms - waited_ms))
+            return agent.plan_turn(game, agent_id, state, clock=clock)
+
+        self.turns += 1
+        # A turn on the clock beats pondering: free the search threads for it.
+        for ponderer in self.pondering:
+            ponderer.halt()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+
+    def start_pondering(self, ponderer, game, move):
+        """agent.start_pondering as a search pool job; returns its future."""
+        ponderer.reset()
+        self.pondering.add(ponderer)
+
+        def job():
+            position = agent.ponder_position(game, move)
+            if position is not None and not ponderer.stopping:
+                ponderer.run(*position)
+
+        return self.executor.submit(job)
+
+    async def stop_pondering(self, ponderer, pondering):
+        """Halt the ponder job `pondering` and wait for it without blocking the loop."""
+        if pondering is None:
+            return
+        self.pondering.discard(ponderer)
+        ponderer.halt()
+        if not pondering.cancel():
+            await asyncio.wrap_future(pondering)
+
+    def budgeted(self, scheduler):
+        """self.http behind one agent's PollScheduler budget and counters."""
+
+        async def http(method, path, **kwargs):
+            delay = scheduler.admit(agent.endpoint_label(method, path))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return await self.http(method, path, **kwargs)
+
+        return http
+
+    async def register(self, name, path, http):
+        status, data = await http("POST", "/agents/register", payload={"name": name})
+        if status != 200:
+            print(f"[agent:{name}] register failed: {status} {data}")
+            return "", ""
+        agent.save_token(data["api_key"], data["id"], path=path, agent_name=name)
+        return data["api_key"], data["id"]
+
+    async def run_agent(self, name):
+        """daemon_agent.main() for one agent."""
+        scheduler = agent.PollScheduler()
+        http = self.budgeted(scheduler)
+        path = os.path.join(self.credential_dir, f"{name}.json")
+        token, agent_id = agent.load_saved_credentials(path=path, agent_name=name)
+        if not token:
+            token, agent_id = await self.register(name, path, http)
+            if not token:
+                print(f"[agent:{name}] name may already exist; skipping agent")
+                return
+            print(f"[agent:{name}] registered agent={agent_id}")
+        elif not agent_id:
+            me_status, me_data = await agent.get_me(token, http=http)
+            if me_status == 200 and me_data.get("id"):
+                agent_id = str(me_data.get("id"))
+                agent.save_token(token, agent_id, path=path, agent_name=name)
+
+        session = agent.AgentSession(scheduler, prefix=f"[agent:{name}] ")
+        while True:
+            step = session.on_wait(*await agent.wait_agent_state(token, session.revision, http=http))
+            if step == session.REGISTER:
+                token, agent_id = await self.register(name, path, http)
+                if not token:
+                    print(f"[agent:{name}] stored key invalid and name is not reusable; stopping agent")
+                    return
+                print(f"[agent:{name}] token refreshed via re-register agent={agent_id}")
+                session.registered()
+                await asyncio.sleep(session.delay)
+                continue
+            if step == session.JOIN:
+                session.on_join(*await agent.join_queue(token, http=http))
+            if step in (session.RETRY, session.JOIN):
+                await asyncio.sleep(session.delay)
+            if step != session.PLAY:
+                continue
+
+            await self.run_game(token, session.active, agent_id, scheduler)
+            if agent.EXIT_AFTER_GAME:
+                return
+            session.game_over()
+
+    async def run_game(self, token, game, agent_id, scheduler):
+        """daemon_agent.run_game_loop on the event loop; GameSession makes the decisions."""
+        session = agent.GameSession(game, agent_id, scheduler)
+        game_id = session.game_id
+        ponderer = session.state.ponderer
+        pondering = None
+        http = self.budgeted(scheduler)
+
+        while True:
+            if session.wants_wait():
+                step = session.on_wait(*await agent.wait_game(*session.wait_args(), http=http))
+                if step == session.LEAVE:
+                    await self.stop_pondering(ponderer, pondering)
+                    return
+                if step == session.RETRY:
+                    await asyncio.sleep(session.delay)
+                if step != session.GO:
+                    continue
+            await self.stop_pondering(ponderer, pondering)
+            pondering = None
+            if session.needs_fetch():
+                step = session.on_fetch(*await agent.get_game(game_id, http=http))
+                if step == session.LEAVE:
+                    return
+                if step == session.RETRY:
+                    await asyncio.sleep(session.delay)
+                    continue
+            full = session.game()
+
+            if full.get("status") == "finished":
+                session.log_end(full, http_pool=self.pool)
+                print(
+                    f"[game:{game_id}] host turns={self.turns}"
+                    f" queued_ms={self.queued_ms / max(1, self.turns):.1f}/turn"
+                )
+                return
+
+            action = await self.plan_turn(full, session.agent_id, session.state)
+            if action is None:
+                continue
+            code, resp = await agent.submit_turn(token, game_id, action, http=http)
+            if session.on_post(action, code, resp) == session.RETRY:
+                await asyncio.sleep(session.delay)
+            elif session.should_ponder(action, code):
+                pondering = self.start_pondering(ponderer, full, action["move"])
+
+
+def agent_names(args):
+    names = [name.strip() for name in (args.agents or "").split(",") if name.strip()]
+    names.extend(f"{args.prefix}{i + 1}" for i in range(args.count))
+    return list(dict.fromkeys(names))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", default="", help="comma-separated agent names")
+    parser.add_argument("--prefix", default=agent.AGENT_NAME + "-", help="name prefix for --count agents")
+    parser.add_argument("--count", type=int, default=0, help="add <prefix>1..<prefix>N agents")
+    parser.add_argument("--credential-dir", default=DEFAULT_CREDENTIAL_DIR)
+    parser.add_argument("--search-threads", type=int, default=1, help="concurrent turn decisions")
+    args = parser.parse_args()
+    names = agent_names(args)
+    if not names:
+        parser.error("no agents: pass --agents and/or --count")
+
+    host = AgentHost(names, args.credential_dir, max(1, args.search_threads))
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(host.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""Benchmark the engine over the checked-in position corpus.
+
+Usage:
+  python agents/bench_engine.py
+  python agents/bench_engine.py --out before.json
+  python agents/bench_engine.py --baseline before.json
+  python agents/bench_engine.py --rounds 1 --update-counters
+
+Replays every position in bench_positions.json (opening, middlegame and
+tactical) and times choose_move, decide_swap, decide_offer10_proposal,
+find_immediate_wins and quick_position_score on each position they apply
+to, in the game state the server would send for it. choose_move runs
+negamax to a fixed SEARCH_MAX_DEPTH under a clock it never reaches, and
+VCT is bounded by VCT_MAX_NODES instead of time, so every run does the
+same work. Each position is timed by its fastest of --rounds passes.
+Prints positions/sec, nodes/sec and latency percentiles per benchmark
+and writes them as JSON with --out.
+
+The gate is deterministic: search nodes, transposition table hits and a
+digest of the decisions made must equal the checked-in
+bench_counters.json, or the run exits with status 1. They change only
+when the engine does; re-record them with --update-counters when that is
+intended. Timings depend on the machine and its load, so they are only
+compared with an earlier --out result passed as --baseline, and a
+slowdown beyond --tolerance is a warning.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("AGENT_DETERMINISTIC", "1")
+os.environ.setdefault("SEARCH_ENGINE", "negamax")
+os.environ.setdefault("SEARCH_MAX_DEPTH", "4")
+os.environ.setdefault("VCT_MAX_NODES", "2000")
+os.environ.setdefault("VCT_TIME_MS", "600000")
+# Time the engine, not the book; bench_parallel.py covers RootPool.
+os.environ["OPENING_BOOK_PATH"] = ""
+os.environ["PARALLEL_WORKERS"] = "0"
+
+import daemon_agent as agent  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_positions.json")
+DEFAULT_COUNTERS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_counters.json")
+BLACK_ID = "bench-black"
+WHITE_ID = "bench-white"
+COLOR_NAMES = {agent.BLACK: "black", agent.WHITE: "white"}
+
+# Search work done by the calls being measured; reset before each sample.
+counters = {"nodes": 0, "tt_hits": 0}
+
+
+def counting(base, method):
+    # Each search resets .nodes when it starts; add them up across calls.
+    def run(self, *args, **kwargs):
+        table = getattr(self, "table", None)
+        hits = table.hits if table is not None else 0
+        try:
+            return getattr(base, method)(self, *args, **kwargs)
+        finally:
+            counters["nodes"] += self.nodes
+            if table is not None:
+                counters["tt_hits"] += table.hits - hits
+
+    return type(base.__name__, (base,), {method: run})
+
+
+agent.NegamaxSearch = counting(agent.NegamaxSearch, "search")
+agent.VcfSolver = counting(agent.VcfSolver, "solve")
+agent.VctSolver = counting(agent.VctSolver, "solve")
+
+
+def load_corpus(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    positions = []
+    for entry in json.loads(raw):
+        board = agent.Board()
+        stone = agent.BLACK
+        for x, y in entry["moves"]:
+            board.make(agent.cell_index(x, y), stone)
+            stone = agent.other_stone(stone)
+        positions.append((entry["name"], entry["category"], board, stone))
+    return positions, hashlib.sha256(raw).hexdigest()[:16]
+
+
+def game_for(board, stone, swap_pending=False):
+    """Return the GET /games/:id view of `board` with `stone` to move.
+
+    As on the server, every one of moves 1-5 is followed by a swap decision;
+    while it is pending there are no legal moves, and offer10 is only open
+    after move 4 once the swap is decided.
+    """
+    rows = [[None] * agent.BOARD_SIZE for _ in range(agent.BOARD_SIZE)]
+    for idx in board.history:
+        x, y = agent.cell_coords(idx)
+        rows[y][x] = COLOR_NAMES[board.cells[idx]]
+    moves = len(board.history)
+    swap_pending = swap_pending and 1 <= moves <= agent.BOOK_MAX_STONES
+    decided = min(moves, agent.BOOK_MAX_STONES) - (1 if swap_pending else 0)
+    legal = [agent.move_dict(idx) for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+    return {
+        "status": "active",
+        "move_number": moves,
+        "turn_color": COLOR_NAMES[stone],
+        "black_agent_id": BLACK_ID,
+        "white_agent_id": WHITE_ID,
+        "board": rows,
+        "legal_moves": None if swap_pending else legal,
+        "opening_state": {
+            "tentative_black_agent_id": BLACK_ID,
+            "tentative_white_agent_id": WHITE_ID,
+            "awaiting_swap": swap_pending,
+            "swap_after_move": moves if swap_pending else None,
+            "swap_history": [{"after_move": n + 1, "swapped": False} for n in range(decided)],
+            "awaiting_offer10": moves == 4 and not swap_pending,
+            "awaiting_offer10_selection": False,
+            "offer10_id": None,
+        },
+    }
+
+
+def calls_for(name, positions, time_ms):
+    """Yield (position, call) pairs for benchmark `name`; skipped positions yield nothing.
+
+    A call returns the decision it made, with any float detail left out so
+    the digest does not depend on the platform's math library.
+    """
+    for _, _, board, stone in positions:
+        game = game_for(board, stone, swap_pending=name == "decide_swap")
+        if name == "choose_move":
+            yield board, lambda g=game: agent.choose_move(g, clock=agent.TimeManager.fixed(time_ms))
+        elif name == "decide_swap" and game["opening_state"]["awaiting_swap"]:
+            decider = agent.get_swap_decider_agent_id(game)
+            yield board, lambda g=game, d=decider: agent.decide_swap(g, d)[0]
+        elif name == "decide_offer10_proposal" and game["opening_state"]["awaiting_offer10"]:
+            yield board, lambda g=game: agent.decide_offer10_proposal(g, BLACK_ID)[:2]
+        elif name == "find_immediate_wins":
+            yield board, lambda b=board, s=stone: agent.find_immediate_wins(b, agent.other_stone(s))
+        elif name == "quick_position_score":
+            yield board, lambda b=board, s=stone: agent.quick_position_score(b, s)
+
+
+# Calls per sample: the cheap helpers are too fast to time one call at a time.
+BENCHMARKS = {
+    "choose_move": 1,
+    "decide_swap": 20,
+    "decide_offer10_proposal": 3,
+    "find_immediate_wins": 2000,
+    "quick_position_score": 50,
+}
+
+
+def percentile(ordered, fraction):
+    # Nearest rank on an already sorted list.
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def run_benchmark(name, positions, rounds, time_ms):
+    inner = BENCHMARKS[name]
+    calls = list(calls_for(name, positions, time_ms))
+    best = [float("inf")] * len(calls)
+    work = {"nodes": 0, "tt_hits": 0}
+    decisions = hashlib.sha256()
+    for round_number in range(rounds):
+        for i, (board, call) in enumerate(calls):
+            before = len(board.history)
+            counters["nodes"] = counters["tt_hits"] = 0
+            # Same random stream for every sample, whatever ran before it.
+            agent.RNG.seed(0)
+            started = time.perf_counter()
+            for _ in range(inner):
+                decision = call()
+            best[i] = min(best[i], (time.perf_counter() - started) / inner)
+            if len(board.history) != before:
+                raise RuntimeError(f"{name} left the board changed")
+            if round_number == 0:
+                work["nodes"] += counters["nodes"]
+                work["tt_hits"] += counters["tt_hits"]
+                decisions.update(repr(decision).encode())
+    # Each position keeps its fastest round, which filters out machine noise.
+    samples = best
+    total = sum(samples)
+    ordered = sorted(samples)
+    return {
+        "calls": len(samples),
+        "nodes": work["nodes"],
+        "tt_hits": work["tt_hits"],
+        "decisions": decisions.hexdigest()[:16],
+        "seconds": round(total, 4),
+        "positions_per_sec": round(len(samples) / total, 2) if total else 0.0,
+        "nodes_per_sec": round(work["nodes"] / total) if total else 0,
+        "latency_ms": {
+            "mean": round(total / len(samples) * 1000.0, 4) if samples else 0.0,
+            "p50": round(percentile(ordered, 0.50) * 1000.0, 4) if samples else 0.0,
+            "p90": round(percentile(ordered, 0.90) * 1000.0, 4) if samples else 0.0,
+            "p99": round(percentile(ordered, 0.99) * 1000.0, 4) if samples else 0.0,
+            "max": round(ordered[-1] * 1000.0, 4) if samples else 0.0,
+        },
+    }
+
+
+# The fields of a result that only change when the engine does, and the
+# settings they depend on.
+COUNTER_FIELDS = ("calls", "nodes", "tt_hits", "decisions")
+SETUP_KEYS = ("corpus", "positions", "search_engine", "search_max_depth", "vct_max_nodes", "numpy")
+
+
+def counters_of(result):
+    return {
+        "meta": {key: value for key, value in result["meta"].items() if key in SETUP_KEYS},
+        "benchmarks": {
+            name: {field: stats[field] for field in COUNTER_FIELDS} for name, stats in result["benchmarks"].items()
+        },
+    }
+
+
+def check_counters(result, recorded):
+    """Print each benchmark's counters against `recorded`; return the names that differ."""
+    current = counters_of(result)
+    if current["meta"] != recorded["meta"]:
+        differs = [key for key in SETUP_KEYS if current["meta"].get(key) != recorded["meta"].get(key)]
+        print(f"counters were recorded with other {', '.join(differs)}; they do not apply to this setup")
+        return list(current["benchmarks"])
+    changed = []
+    for name, stats in current["benchmarks"].items():
+        expected = recorded["benchmarks"].get(name)
+        if expected == stats:
+            print(f"{name}: counters match")
+            continue
+        changed.append(name)
+        if expected is None:
+            print(f"{name}: no recorded counters")
+            continue
+        diffs = [
+            f"{field} {expected.get(field)} -> {stats[field]}"
+            for field in COUNTER_FIELDS
+            if expected.get(field) != stats[field]
+        ]
+        print(f"{name}: CHANGED {' '.join(diffs)}")
+    return changed
+
+
+def compare_timings(result, baseline, tolerance):
+    """Print each benchmark's speed against an earlier result; slowdowns are only reported."""
+    differs = [key for key, value in result["meta"].items() if key != "rounds" and baseline["meta"].get(key) != value]
+    if differs:
+        # Another corpus, search setting or interpreter: the ratios say little.
+        print(f"timing baseline differs in {', '.join(differs)}")
+    for name, current in result["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base or not base["positions_per_sec"]:
+            continue
+        ratio = current["positions_per_sec"] / base["positions_per_sec"]
+        line = f"{name}: {ratio:.2f}x baseline speed"
+        if ratio < 1.0 - tolerance:
+            line += f" (warning: more than {tolerance:.0%} slower)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--only", help="comma-separated benchmarks to run")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the corpus; the fastest counts")
+    parser.add_argument("--time-ms", type=int, default=600000, help="choose_move clock, a safety cap")
+    parser.add_argument("--out", help="write the JSON result here")
+    parser.add_argument("--counters", default=DEFAULT_COUNTERS, help="recorded counters to check; '' skips")
+    parser.add_argument("--update-counters", action="store_true", help="record this run's counters in --counters")
+    parser.add_argument("--baseline", help="earlier --out result to compare timings with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="slowdown to warn about")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    if args.update_counters and not args.counters:
+        parser.error("--update-counters needs a --counters path")
+    recorded = None
+    if args.counters and os.path.exists(args.counters):
+        with open(args.counters) as f:
+            recorded = json.load(f)
+    elif args.counters and not args.update_counters:
+        parser.error(f"no counters at {args.counters}: record them with --update-counters, or pass --counters ''")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    positions, digest = load_corpus(args.corpus)
+    result = {
+        "meta": {
+            "corpus": digest,
+            "positions": len(positions),
+            "rounds": args.rounds,
+            "search_engine": agent.SEARCH_ENGINE,
+            "search_max_depth": agent.SEARCH_MAX_DEPTH,
+            "vct_max_nodes": agent.VCT_MAX_NODES,
+            "numpy": agent.NUMPY_ENABLED,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+        },
+        "benchmarks": {},
+    }
+    for name in names:
+        stats = run_benchmark(name, positions, args.rounds, args.time_ms)
+        result["benchmarks"][name] = stats
+        latency = stats["latency_ms"]
+        print(
+            f"{name} calls={stats['calls']} pos/s={stats['positions_per_sec']} nodes/s={stats['nodes_per_sec']}"
+            f" p50={latency['p50']}ms p90={latency['p90']}ms p99={latency['p99']}ms max={latency['max']}ms"
+        )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if baseline is not None:
+        compare_timings(result, baseline, args.tolerance)
+    if args.update_counters:
+        counters_file = counters_of(result)
+        if recorded is not None and recorded["meta"] == counters_file["meta"]:
+            # A partial --only run keeps the other benchmarks' counters.
+            counters_file["benchmarks"] = {**recorded["benchmarks"], **counters_file["benchmarks"]}
+        with open(args.counters, "w") as f:
+            json.dump(counters_file, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"counters recorded in {args.counters}")
+    elif recorded is not None and check_counters(result, recorded):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
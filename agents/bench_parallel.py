@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Benchmark the root-parallel search against the serial lookahead.
+
+Usage:
+  python agents/bench_parallel.py --workers 8 --positions 20
+
+Plays seeded random middlegames, then times best_move_with_lookahead
+serially and through RootPool on every position, checking that both pick
+the same move. With --negamax it also reports the depth the serial and
+parallel negamax reach in the same time budget.
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("AGENT_DETERMINISTIC", "1")
+
+import daemon_agent as agent  # noqa: E402
+
+
+def random_position(seed, min_stones=8, max_stones=30):
+    rng = random.Random(seed)
+    board = agent.Board()
+    stone = agent.BLACK
+    for _ in range(rng.randint(min_stones, max_stones)):
+        frontier = agent.collect_frontier_moves(board, radius=1)
+        idx = rng.choice(frontier)
+        if idx in board.wins[stone]:
+            break
+        board.make(idx, stone)
+        stone = agent.other_stone(stone)
+    return board, stone
+
+
+def root_candidates(board, stone):
+    frontier = agent.collect_frontier_moves(board, radius=2)
+    return agent.shortlist_moves(board, frontier, agent.other_stone(stone), limit=agent.ROOT_CANDIDATES)
+
+
+def bench_lookahead(pool, positions, depth):
+    serial_time = parallel_time = 0.0
+    mismatches = 0
+    for board, stone in positions:
+        moves = root_candidates(board, stone)
+        agent.RNG.seed(0)
+        started = time.perf_counter()
+        serial = agent.best_move_with_lookahead(board, moves, stone, depth)
+        serial_time += time.perf_counter() - started
+        agent.RNG.seed(0)
+        started = time.perf_counter()
+        parallel = pool.lookahead(board, moves, stone, depth)
+        parallel_time += time.perf_counter() - started
+        mismatches += serial != parallel
+    return serial_time, parallel_time, mismatches
+
+
+def bench_negamax(pool, positions, time_ms):
+    serial_depth = parallel_depth = 0
+    serial_nodes = parallel_nodes = 0
+    for board, stone in positions:
+        moves = root_candidates(board, stone)
+        search = agent.NegamaxSearch(board, time_ms=time_ms)
+        search.search(stone, moves)
+        serial_depth += search.depth_reached
+        serial_nodes += search.nodes
+        pool.negamax(board, moves, stone, agent.TimeManager.fixed(time_ms))
+        parallel_depth += pool.depth_reached
+        parallel_nodes += pool.nodes
+    count = len(positions)
+    return serial_depth / count, parallel_depth / count, serial_nodes, parallel_nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--depth", type=int, default=agent.LOOKAHEAD_DEPTH)
+    parser.add_argument("--negamax", action="store_true", help="also compare negamax depth")
+    parser.add_argument("--time-ms", type=int, default=1000, help="negamax budget per position")
+    args = parser.parse_args()
+
+    positions = [random_position(args.seed + i) for i in range(args.positions)]
+    pool = agent.RootPool(args.workers)
+    try:
+        # Warm the workers so process start-up is not counted.
+        board, stone = positions[0]
+        pool.lookahead(board, root_candidates(board, stone), stone, 1)
+        serial_time, parallel_time, mismatches = bench_lookahead(pool, positions, args.depth)
+        print(
+            f"lookahead depth={args.depth} positions={len(positions)} workers={args.workers}"
+            f" serial={serial_time:.3f}s parallel={parallel_time:.3f}s"
+            f" speedup={serial_time / parallel_time:.2f}x mismatches={mismatches}"
+        )
+        if args.negamax:
+            serial_depth, parallel_depth, serial_nodes, parallel_nodes = bench_negamax(pool, positions, args.time_ms)
+            print(
+                f"negamax time_ms={args.time_ms} avg_depth serial={serial_depth:.2f} parallel={parallel_depth:.2f}"
+                f" nodes serial={serial_nodes} parallel={parallel_nodes}"
+            )
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Build the opening book that daemon_agent.py maps at start-up.
+
+Usage:
+  python agents/build_opening_book.py --width 4 --depth 3 --samples 300
+
+Walks the engine's own best replies from the empty board (--width per
+ply) plus --samples seeded random local openings, up to five stones.
+Every position with fewer than five stones gets its move ranking from a
+full-window negamax of each root candidate at --depth; every position
+with one to five stones gets its swap scores; four-stone positions also
+get the offer10 proposal and the selection score of each frontier cell.
+The book is written to OPENING_BOOK_PATH (agents/opening_book.bin) or
+--out. Rebuild it after changing the evaluation.
+"""
+
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("AGENT_DETERMINISTIC", "1")
+# Score every position live instead of reading an existing book.
+os.environ["OPENING_BOOK_PATH"] = ""
+
+import daemon_agent as agent  # noqa: E402
+
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+def stone_to_move(board):
+    return agent.BLACK if len(board.history) % 2 == 0 else agent.WHITE
+
+
+def root_candidates(board, stone):
+    # The pool choose_move searches in the opening: nearby cells, one per symmetric set.
+    frontier = agent.drop_forbidden(board, agent.collect_frontier_moves(board, radius=2), stone)
+    frontier = agent.unique_moves(board, frontier)
+    limit = agent.ROOT_CANDIDATES + 4
+    return agent.shortlist_moves(board, frontier, agent.other_stone(stone), limit=limit)
+
+
+def rank_moves(board, stone, depth):
+    # No clock pressure offline: every candidate gets an exact score.
+    search = agent.NegamaxSearch(board, clock=agent.TimeManager.fixed(10**9))
+    scored = [(search.score_root_move(stone, idx, depth), idx) for idx in root_candidates(board, stone)]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored[:10]
+
+
+def swap_entry(board):
+    # The swap after move n is decided by the side that did not play it, and
+    # both choices leave the same colour to move next.
+    stones = len(board.history)
+    decider = agent.WHITE if stones % 2 == 1 else agent.BLACK
+    next_turn = agent.BLACK if stones < 5 and stones % 2 == 0 else agent.WHITE
+    keep, swap = agent.opening_swap_scores(board, decider, next_turn, next_turn)
+    return agent.OpeningBook.entry(board, agent.BOOK_SWAP, decider, scores=(keep, swap))
+
+
+def offer10_entries(board):
+    moves = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+    normal, offer, candidates = agent.offer10_scores(board, moves)
+    offered = [agent.cell_index(m["x"], m["y"]) for m in candidates]
+    scale = agent.BOOK_PROB_SCALE
+    entries = [
+        agent.OpeningBook.entry(
+            board, agent.BOOK_OFFER10, agent.BLACK, offered, (round(normal * scale), round(offer * scale))
+        )
+    ]
+    # Selection records are canonical, so symmetric candidates share one.
+    for idx in agent.unique_moves(board, agent.collect_frontier_moves(board, radius=2)):
+        board.make(idx, agent.BLACK)
+        score = agent.offer10_selection_score(board, agent.WHITE)
+        entries.append(agent.OpeningBook.entry(board, agent.BOOK_SELECT, agent.WHITE, scores=(score,)))
+        board.unmake()
+    return entries
+
+
+def sampled_openings(samples, seed):
+    rng = random.Random(seed)
+    levels = [[] for _ in range(agent.BOOK_MAX_STONES + 1)]
+    for _ in range(samples):
+        board = agent.Board()
+        levels[0].append(board.copy())
+        for stones in range(agent.BOOK_MAX_STONES):
+            frontier = agent.collect_frontier_moves(board, radius=1)
+            board.make(rng.choice(frontier), stone_to_move(board))
+            levels[stones + 1].append(board.copy())
+    return levels
+
+
+def build(width, depth, samples, seed):
+    levels = sampled_openings(samples, seed)
+    levels[0].append(agent.Board())
+    entries = []
+    for stones, boards in enumerate(levels):
+        started = time.perf_counter()
+        seen = set()
+        for board in boards:
+            key, _ = agent.canonical_hash(board)
+            if key in seen:
+                continue
+            seen.add(key)
+            if stones:
+                entries.append(swap_entry(board))
+            if stones == agent.BOOK_MAX_STONES:
+                continue
+            if stones == agent.BOOK_MAX_STONES - 1:
+                entries.extend(offer10_entries(board))
+            stone = stone_to_move(board)
+            ranked = rank_moves(board, stone, depth)
+            entries.append(
+                agent.OpeningBook.entry(
+                    board,
+                    agent.BOOK_MOVE,
+                    stone,
+                    [idx for _, idx in ranked],
+                    [score for score, _ in ranked],
+                )
+            )
+            for _, idx in ranked[:width]:
+                child = board.copy()
+                child.make(idx, stone)
+                levels[stones + 1].append(child)
+        print(f"stones={stones} positions={len(seen)} {time.perf_counter() - started:.1f}s")
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=3, help="engine replies expanded per position")
+    parser.add_argument("--depth", type=int, default=3, help="negamax depth for move rankings")
+    parser.add_argument("--samples", type=int, default=100, help="random local openings to add")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    entries = build(args.width, args.depth, args.samples, args.seed)
+    count = agent.OpeningBook.write(args.out, entries)
+    size = os.path.getsize(args.out)
+    print(f"wrote {count} records ({size} bytes) to {args.out} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
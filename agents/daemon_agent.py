@@ -8,14 +8,24 @@ Usage:
   python agents/daemon_agent.py
 """
 
+import datetime
+import http.client
 import json
 import math
+import mmap
+import multiprocessing
 import os
 import random
+import ssl
+import struct
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python scans are the fallback.
+    np = None
 
 BASE_URL = os.getenv("ARENA_BASE_URL", "http://localhost:4000").rstrip("/")
 AGENT_NAME = os.getenv("AGENT_NAME", "python-daemon")
@@ -25,6 +35,13 @@ CREDENTIAL_PATH = os.path.expanduser(
 )
 WAIT_TIMEOUT = int(os.getenv("WAIT_TIMEOUT", "25"))
 IDLE_SLEEP = float(os.getenv("IDLE_SLEEP", "2"))
+# Idle keep-alive connections kept for reuse; 0 closes every connection after its call.
+HTTP_POOL_SIZE = max(0, int(os.getenv("HTTP_POOL_SIZE", "4")))
+# Per-agent request budget (requests per minute, 0 = unlimited) with a burst
+# allowance, and the cap on backoff after repeated failures, in seconds.
+POLL_BUDGET_RPM = max(0.0, float(os.getenv("POLL_BUDGET_RPM", "240")))
+POLL_BUDGET_BURST = max(1, int(os.getenv("POLL_BUDGET_BURST", "30")))
+POLL_BACKOFF_MAX = max(0.1, float(os.getenv("POLL_BACKOFF_MAX", "30")))
 EXIT_AFTER_GAME = os.getenv("EXIT_AFTER_GAME", "0").strip().lower() in (
     "1",
     "true",
@@ -34,9 +51,72 @@ EXIT_AFTER_GAME = os.getenv("EXIT_AFTER_GAME", "0").strip().lower() in (
 BOARD_SIZE = 15
 CENTER = 7
 DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1))
+EMPTY = 0
+BLACK = 1
+WHITE = 2
+WALL = 3
+STONE_BY_COLOR = {"black": BLACK, "white": WHITE}
+BOARD_PAD = 4
+BOARD_STRIDE = BOARD_SIZE + BOARD_PAD
 LOOKAHEAD_DEPTH = max(1, min(3, int(os.getenv("LOOKAHEAD_DEPTH", "2"))))
 ROOT_CANDIDATES = max(8, int(os.getenv("ROOT_CANDIDATES", "14")))
 REPLY_CANDIDATES = max(6, int(os.getenv("REPLY_CANDIDATES", "10")))
+# "lookahead" keeps the fixed two-ply blend; "negamax" runs iterative-deepening alpha-beta;
+# "mcts" runs a PUCT tree search.
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "lookahead").strip().lower()
+SEARCH_MAX_DEPTH = max(1, int(os.getenv("SEARCH_MAX_DEPTH", "10")))
+SEARCH_TIME_MS = max(50, int(os.getenv("SEARCH_TIME_MS", "3000")))
+SEARCH_WIDTH = max(4, int(os.getenv("SEARCH_WIDTH", "10")))
+QUIESCENCE_DEPTH = max(0, int(os.getenv("QUIESCENCE_DEPTH", "4")))
+MCTS_BATCH = max(1, int(os.getenv("MCTS_BATCH", "16")))
+MCTS_WIDTH = max(2, int(os.getenv("MCTS_WIDTH", "12")))
+MCTS_EXPLORATION = float(os.getenv("MCTS_EXPLORATION", "1.4"))
+MCTS_VALUE_SCALE = max(1.0, float(os.getenv("MCTS_VALUE_SCALE", "3000")))
+# Per-move budget: a fraction of the turn clock, capped at SEARCH_TIME_MS, with
+# up to TIME_EXTEND_FACTOR times that for unstable or tactical positions.
+TIME_SAFETY_MS = max(0, int(os.getenv("TIME_SAFETY_MS", "1500")))
+TIME_MOVE_FRACTION = min(1.0, max(0.01, float(os.getenv("TIME_MOVE_FRACTION", "0.25"))))
+TIME_EXTEND_FACTOR = max(1.0, float(os.getenv("TIME_EXTEND_FACTOR", "2.5")))
+# Root moves are scored on this many worker processes, at most one per CPU;
+# 0 or 1 keeps the search serial.
+PARALLEL_WORKERS = max(0, int(os.getenv("PARALLEL_WORKERS", "0")))
+# Pondering searches the opponent's likely replies while wait_game long-polls.
+PONDER_ENABLED = os.getenv("PONDER", "0").strip().lower() in ("1", "true", "yes", "on")
+PONDER_REPLIES = max(1, int(os.getenv("PONDER_REPLIES", "4")))
+PONDER_TIME_MS = max(50, int(os.getenv("PONDER_TIME_MS", "3000")))
+VCF_ENABLED = os.getenv("VCF_ENABLED", "1").strip().lower() not in (
+    "0",
+    "false",
+    "no",
+    "off",
+)
+VCF_MAX_NODES = max(100, int(os.getenv("VCF_MAX_NODES", "2000")))
+VCF_MAX_DEPTH = max(1, int(os.getenv("VCF_MAX_DEPTH", "16")))
+VCT_ENABLED = os.getenv("VCT_ENABLED", "1").strip().lower() not in (
+    "0",
+    "false",
+    "no",
+    "off",
+)
+VCT_MAX_NODES = max(100, int(os.getenv("VCT_MAX_NODES", "20000")))
+VCT_MAX_DEPTH = max(1, int(os.getenv("VCT_MAX_DEPTH", "6")))
+VCT_TIME_MS = max(10, int(os.getenv("VCT_TIME_MS", "300")))
+# The server (renju.ts) forbids black overlines and double-fours but, as written,
+# never reports a double-three. Opt in to also avoid textbook black double-threes.
+RENJU_DOUBLE_THREE = os.getenv("RENJU_DOUBLE_THREE", "0").strip().lower() in ("1", "true", "yes", "on")
+# Transposition table slots as a power of two; each slot is one small tuple (~150 bytes).
+TT_BITS = max(10, min(24, int(os.getenv("TT_BITS", "17"))))
+# When set, every process on the host shares one table in this mmap'd file
+# (e.g. /dev/shm/renju-tt.bin) of SHARED_TT_MB megabytes.
+SHARED_TT_PATH = os.getenv("SHARED_TT_PATH", "").strip()
+SHARED_TT_MB = max(1, int(os.getenv("SHARED_TT_MB", "64")))
+# Up to this many stones the search shares transposition entries between
+# symmetric positions and skips symmetric moves; later boards are rarely symmetric.
+SYMMETRY_MAX_STONES = max(0, int(os.getenv("SYMMETRY_MAX_STONES", "8")))
+# Opening decisions written by agents/build_opening_book.py; empty disables the book.
+OPENING_BOOK_PATH = os.getenv(
+    "OPENING_BOOK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+).strip()
 EARLY_LOCALITY_UNTIL = max(8, int(os.getenv("EARLY_LOCALITY_UNTIL", "14")))
 SWAP_MARGIN = int(os.getenv("SWAP_MARGIN", "450"))
 DIVERSITY_TOP_N = max(1, min(6, int(os.getenv("DIVERSITY_TOP_N", "3"))))
@@ -61,6 +141,16 @@ DETERMINISTIC_MODE = os.getenv("AGENT_DETERMINISTIC", "0").strip().lower() in (
     "yes",
     "on",
 )
+# Opt-in: with incremental neighbour counts the Python shortlist usually wins on CPython.
+NUMPY_ENABLED = np is not None and os.getenv("ENGINE_NUMPY", "0").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+# Below these sizes the per-move Python loops are cheaper than building arrays.
+NUMPY_MIN_MOVES = max(1, int(os.getenv("ENGINE_NUMPY_MIN_MOVES", "24")))
+NUMPY_MIN_STONES = 6
 RNG_SEED_RAW = os.getenv("AGENT_RNG_SEED", "").strip()
 if RNG_SEED_RAW:
     try:
@@ -73,68 +163,188 @@ else:
     RNG = random.Random()
 
 
-def http_json(method, path, token=None, payload=None, timeout=30):
-    url = f"{BASE_URL}{path}"
+class HttpPool:
+    """Keep-alive http.client connections to the arena API.
+
+    Idle connections are pooled (up to `max_idle`) and reused, so a turn's
+    wait, fetch and move share one TCP/TLS handshake. A reused connection
+    the server has meanwhile closed fails before any response; that request
+    is retried once on a fresh connection. Each call sets its own timeout,
+    and calls are counted per endpoint with their latency.
+    """
+
+    STALE_ERRORS = (http.client.BadStatusLine, ConnectionError)
+
+    def __init__(self, base_url=BASE_URL, max_idle=HTTP_POOL_SIZE):
+        parts = urllib.parse.urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.reconnects = 0
+        self.endpoints = {}
+
+    def request(self, method, path, body, headers, timeout):
+        """Send one request and return (status, body text); network errors raise."""
+        conn, reused = self._acquire(timeout)
+        try:
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                res = conn.getresponse()
+            except self.STALE_ERRORS:
+                if not reused:
+                    raise
+                conn.close()
+                self.reconnects += 1
+                conn = self._connect(timeout)
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                res = conn.getresponse()
+            raw = res.read().decode("utf-8")
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn, not res.will_close)
+        return res.status, raw
+
+    def record(self, endpoint, elapsed_ms, status):
+        with self.lock:
+            counters = self.endpoints.setdefault(endpoint, [0, 0, 0.0, 0.0])
+            counters[0] += 1
+            if status == 0 or status >= 500:
+                counters[1] += 1
+            counters[2] += elapsed_ms
+            counters[3] = max(counters[3], elapsed_ms)
+
+    def stats(self):
+        with self.lock:
+            endpoints = {
+                endpoint: {
+                    "calls": calls,
+                    "errors": errors,
+                    "avg_ms": round(total / calls, 1),
+                    "max_ms": round(worst, 1),
+                }
+                for endpoint, (calls, errors, total, worst) in self.endpoints.items()
+            }
+        return {"connects": self.connects, "reconnects": self.reconnects, "endpoints": endpoints}
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def _connect(self, timeout):
+        self.connects += 1
+        if self.https:
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=timeout, context=ssl.create_default_context()
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout):
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn, reusable):
+        if reusable:
+            with self.lock:
+                if len(self.idle) < self.max_idle:
+                    self.idle.append(conn)
+                    return
+        conn.close()
+
+
+HTTP_POOL = HttpPool()
+
+
+def endpoint_label(method, path):
+    # "GET /games/<id>/wait?..." -> "GET /games/:id/wait", so counters group by route.
+    segments = path.split("?", 1)[0].split("/")
+    for i in range(1, len(segments)):
+        if segments[i - 1] == "games" and segments[i]:
+            segments[i] = ":id"
+    return f"{method} {'/'.join(segments)}"
+
+
+def json_request(token=None, payload=None):
+    """Return (body, headers) for an API call."""
     body = None
     headers = {"Content-Type": "application/json"}
     if token:
         headers["Authorization"] = f"Bearer {token}"
     if payload is not None:
         body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(url, data=body, headers=headers, method=method)
+    return body, headers
+
+
+def json_response(status, raw):
+    # Error bodies may not be JSON; a 2xx that is not JSON raises like a network error.
+    if 200 <= status < 300:
+        return json.loads(raw) if raw else {}
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as res:
-            raw = res.read().decode("utf-8")
-            return res.status, json.loads(raw) if raw else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8")
-        try:
-            return e.code, json.loads(raw) if raw else {}
-        except json.JSONDecodeError:
-            return e.code, {"error": raw}
+        return json.loads(raw) if raw else {}
+    except json.JSONDecodeError:
+        return {"error": raw}
+
+
+def http_json(method, path, token=None, payload=None, timeout=30):
+    body, headers = json_request(token, payload)
+    started = time.perf_counter()
+    try:
+        status, raw = HTTP_POOL.request(method, path, body, headers, timeout)
+        data = json_response(status, raw)
     except Exception as e:  # noqa: BLE001
-        return 0, {"error": str(e)}
+        status, data = 0, {"error": str(e)}
+    HTTP_POOL.record(endpoint_label(method, path), (time.perf_counter() - started) * 1000.0, status)
+    return status, data
 
 
-def register_agent(name):
-    status, data = http_json("POST", "/agents/register", payload={"name": name})
+def register_agent(name, http=http_json):
+    status, data = http("POST", "/agents/register", payload={"name": name})
     if status != 200:
         raise RuntimeError(f"register failed: {status} {data}")
     return data["api_key"], data["id"]
 
 
-def join_queue(token):
-    status, data = http_json("POST", "/queue/join", token=token, payload={})
-    return status, data
+def join_queue(token, http=http_json):
+    return http("POST", "/queue/join", token=token, payload={})
 
 
-def get_active_game(token):
-    status, data = http_json("GET", "/agents/active-game", token=token)
+def get_active_game(token, http=http_json):
+    status, data = http("GET", "/agents/active-game", token=token)
     return status, data.get("game"), data
 
 
-def get_me(token):
-    status, data = http_json("GET", "/agents/me", token=token)
-    return status, data
+def get_me(token, http=http_json):
+    return http("GET", "/agents/me", token=token)
 
 
-def wait_agent_state(token, since_revision=""):
+def wait_agent_state(token, since_revision="", http=http_json):
     qs = urllib.parse.urlencode(
         {
             "since_revision": since_revision or "",
             "timeout_sec": WAIT_TIMEOUT,
         }
     )
-    status, data = http_json("GET", f"/agents/wait?{qs}", token=token, timeout=WAIT_TIMEOUT + 10)
-    return status, data
+    return http("GET", f"/agents/wait?{qs}", token=token, timeout=WAIT_TIMEOUT + 10)
 
 
-def get_game(game_id):
-    status, data = http_json("GET", f"/games/{game_id}")
-    return status, data
+def get_game(game_id, http=http_json):
+    return http("GET", f"/games/{game_id}")
 
 
-def wait_game(game_id, since_move, since_updated_at, since_revision=""):
+def wait_game(game_id, since_move, since_updated_at, since_revision="", http=http_json):
     qs = urllib.parse.urlencode(
         {
             "since_move": since_move,
@@ -143,16 +353,15 @@ def wait_game(game_id, since_move, since_updated_at, since_revision=""):
             "timeout_sec": WAIT_TIMEOUT,
         }
     )
-    status, data = http_json("GET", f"/games/{game_id}/wait?{qs}", timeout=WAIT_TIMEOUT + 10)
-    return status, data
+    return http("GET", f"/games/{game_id}/wait?{qs}", timeout=WAIT_TIMEOUT + 10)
 
 
-def post_swap(token, game_id, do_swap=False):
-    return http_json("POST", f"/games/{game_id}/swap", token=token, payload={"swap": do_swap})
+def post_swap(token, game_id, do_swap=False, http=http_json):
+    return http("POST", f"/games/{game_id}/swap", token=token, payload={"swap": do_swap})
 
 
-def post_offer10(token, game_id, candidates):
-    return http_json(
+def post_offer10(token, game_id, candidates, http=http_json):
+    return http(
         "POST",
         f"/games/{game_id}/offer10",
         token=token,
@@ -160,8 +369,8 @@ def post_offer10(token, game_id, candidates):
     )
 
 
-def post_offer10_select(token, game_id, x, y):
-    return http_json(
+def post_offer10_select(token, game_id, x, y, http=http_json):
+    return http(
         "POST",
         f"/games/{game_id}/offer10/select",
         token=token,
@@ -169,8 +378,8 @@ def post_offer10_select(token, game_id, x, y):
     )
 
 
-def post_move(token, game_id, x, y, turn_number, idempotency_key):
-    return http_json(
+def post_move(token, game_id, x, y, turn_number, idempotency_key, http=http_json):
+    return http(
         "POST",
         f"/games/{game_id}/move",
         token=token,
@@ -183,8 +392,7 @@ def post_move(token, game_id, x, y, turn_number, idempotency_key):
     )
 
 
-def load_saved_credentials():
-    path = CREDENTIAL_PATH
+def load_saved_credentials(path=CREDENTIAL_PATH, agent_name=AGENT_NAME):
     if not path:
         return "", ""
     if not os.path.isfile(path):
@@ -194,7 +402,7 @@ def load_saved_credentials():
             data = json.load(f)
         if str(data.get("base_url", "")).rstrip("/") != BASE_URL:
             return "", ""
-        if str(data.get("agent_name", "")).strip() != AGENT_NAME:
+        if str(data.get("agent_name", "")).strip() != agent_name:
             return "", ""
         token = str(data.get("api_key", "")).strip()
         agent_id = str(data.get("agent_id", "")).strip()
@@ -203,8 +411,7 @@ def load_saved_credentials():
         return "", ""
 
 
-def save_token(token, agent_id):
-    path = CREDENTIAL_PATH
+def save_token(token, agent_id, path=CREDENTIAL_PATH, agent_name=AGENT_NAME):
     if not path:
         return
     try:
@@ -213,7 +420,7 @@ def save_token(token, agent_id):
             os.makedirs(parent, exist_ok=True)
         payload = {
             "base_url": BASE_URL,
-            "agent_name": AGENT_NAME,
+            "agent_name": agent_name,
             "agent_id": agent_id,
             "api_key": token,
         }
@@ -231,6 +438,427 @@ def opposite(color):
     return "white" if color == "black" else "black"
 
 
+def other_stone(stone):
+    return WHITE if stone == BLACK else BLACK
+
+
+def cell_index(x, y):
+    return (y + BOARD_PAD) * BOARD_STRIDE + x + BOARD_PAD
+
+
+def cell_coords(idx):
+    row, col = divmod(idx, BOARD_STRIDE)
+    return col - BOARD_PAD, row - BOARD_PAD
+
+
+def move_dict(idx):
+    x, y = cell_coords(idx)
+    return {"x": x, "y": y}
+
+
+# Padded 1-D layout: every board cell has BOARD_PAD wall cells on each side in every
+# direction, so line walks stop on WALL and never need an in_bounds check.
+BOARD_CELLS = (BOARD_SIZE + 2 * BOARD_PAD) * BOARD_STRIDE + BOARD_PAD
+BOARD_INDICES = tuple(cell_index(x, y) for y in range(BOARD_SIZE) for x in range(BOARD_SIZE))
+BOARD_INDEX_SET = frozenset(BOARD_INDICES)
+CENTER_INDEX = cell_index(CENTER, CENTER)
+STEPS = tuple(dx + dy * BOARD_STRIDE for dx, dy in DIRECTIONS)
+
+
+def _build_neighborhoods(radius):
+    table = [()] * BOARD_CELLS
+    for y in range(BOARD_SIZE):
+        for x in range(BOARD_SIZE):
+            cells = []
+            for ny in range(max(0, y - radius), min(BOARD_SIZE, y + radius + 1)):
+                for nx in range(max(0, x - radius), min(BOARD_SIZE, x + radius + 1)):
+                    if nx == x and ny == y:
+                        continue
+                    cells.append(cell_index(nx, ny))
+            table[cell_index(x, y)] = tuple(cells)
+    return table
+
+
+NEIGHBORHOODS = {1: _build_neighborhoods(1), 2: _build_neighborhoods(2)}
+
+# Line patterns: for every cell, direction and perspective stone, the 9-cell window
+# centred on the cell is kept encoded in base 3 (digit j covers offset j - 4).
+# Digits are PATTERN_EMPTY, PATTERN_OWN, or PATTERN_BLOCKED for opponent stones
+# and walls, which every shape and threat rule treats the same way.
+PATTERN_EMPTY = 0
+PATTERN_OWN = 1
+PATTERN_BLOCKED = 2
+PATTERN_REACH = 4
+PATTERN_WIDTH = 2 * PATTERN_REACH + 1
+POW3 = tuple(3**j for j in range(PATTERN_WIDTH))
+PATTERN_CODES = 3**PATTERN_WIDTH
+# The cell at position j of idx's window sees idx at position PATTERN_WIDTH - 1 - j.
+MIRRORED_POW3 = POW3[::-1]
+
+
+def _build_line_windows():
+    windows = [None] * BOARD_CELLS
+    for idx in BOARD_INDICES:
+        windows[idx] = tuple(
+            tuple(idx + (j - PATTERN_REACH) * step for j in range(PATTERN_WIDTH))
+            for step in STEPS
+        )
+    return windows
+
+
+# LINE_WINDOWS[idx][d] lists the 9 array cells of idx's window along STEPS[d].
+LINE_WINDOWS = _build_line_windows()
+
+
+def _build_empty_patterns():
+    patterns = []
+    for d in range(len(STEPS)):
+        codes = [0] * BOARD_CELLS
+        for idx in BOARD_INDICES:
+            codes[idx] = sum(
+                PATTERN_BLOCKED * POW3[j]
+                for j, q in enumerate(LINE_WINDOWS[idx][d])
+                if q not in BOARD_INDEX_SET
+            )
+        patterns.append(codes)
+    return patterns
+
+
+EMPTY_PATTERNS = _build_empty_patterns()
+
+
+def decode_line_pattern(code):
+    """Return (shape, block, length, edge) for one 9-cell line pattern code.
+
+    The centre is taken as an own stone. `shape` is the own_shape_score term,
+    `block` the blocking_threat_score term when the code is the opponent's,
+    and `length` the run through the centre as far as the window sees.
+    `edge` has bit 1 (2) set when the run reaches the left (right) end of the
+    window, so the cell one step further out decides five versus overline.
+    """
+    digits = [(code // POW3[j]) % 3 for j in range(PATTERN_WIDTH)]
+
+    left = 0
+    j = PATTERN_REACH - 1
+    while j >= 0 and digits[j] == PATTERN_OWN:
+        left += 1
+        j -= 1
+    left_open = j >= 0 and digits[j] == PATTERN_EMPTY
+
+    right = 0
+    j = PATTERN_REACH + 1
+    while j < PATTERN_WIDTH and digits[j] == PATTERN_OWN:
+        right += 1
+        j += 1
+    right_open = j < PATTERN_WIDTH and digits[j] == PATTERN_EMPTY
+
+    length = left + 1 + right
+    open_ends = int(left_open) + int(right_open)
+
+    shape = 0
+    if length >= 5:
+        shape = 50000
+    elif length == 4:
+        shape = 6000 if open_ends == 2 else 1200
+    elif length == 3:
+        shape = 700 if open_ends == 2 else 130
+    elif length == 2 and open_ends == 2:
+        shape = 50
+
+    span = left + right
+    block = 0
+    if span >= 4:
+        block = 12000
+    elif span == 3:
+        block = 2500 if open_ends >= 1 else 500
+    elif span == 2 and open_ends == 2:
+        block = 300
+
+    edge = int(left == PATTERN_REACH) | (int(right == PATTERN_REACH) << 1)
+    return shape, block, length, edge
+
+
+def decode_four_pattern(code):
+    """Return (white_four, black_fours) for placing the centre of a line pattern.
+
+    `white_four` is true when one more empty cell in the window then gives five
+    or more through the centre. `black_fours` lists, for each empty cell giving
+    a run of exactly five in the window, the offsets just outside the window
+    that must not be black for it to stay an exact five.
+    """
+    digits = [(code // POW3[j]) % 3 for j in range(PATTERN_WIDTH)]
+    digits[PATTERN_REACH] = PATTERN_OWN
+    white_four = False
+    black_fours = []
+    for e in range(PATTERN_WIDTH):
+        if digits[e] != PATTERN_EMPTY:
+            continue
+        lo = e
+        while lo > 0 and digits[lo - 1] == PATTERN_OWN:
+            lo -= 1
+        hi = e
+        while hi < PATTERN_WIDTH - 1 and digits[hi + 1] == PATTERN_OWN:
+            hi += 1
+        if not lo <= PATTERN_REACH <= hi:
+            continue
+        length = hi - lo + 1
+        if length >= 5:
+            white_four = True
+        if length == 5:
+            checks = []
+            if lo == 0:
+                checks.append(-PATTERN_REACH - 1)
+            if hi == PATTERN_WIDTH - 1:
+                checks.append(PATTERN_REACH + 1)
+            black_fours.append(tuple(checks))
+    return white_four, tuple(black_fours)
+
+
+def _build_pattern_tables():
+    shape_scores = [0] * PATTERN_CODES
+    block_scores = [0] * PATTERN_CODES
+    run_lengths = [0] * PATTERN_CODES
+    run_edges = [0] * PATTERN_CODES
+    white_fours = [False] * PATTERN_CODES
+    black_fours = [()] * PATTERN_CODES
+    for code in range(PATTERN_CODES):
+        shape_scores[code], block_scores[code], run_lengths[code], run_edges[code] = (
+            decode_line_pattern(code)
+        )
+        white_fours[code], black_fours[code] = decode_four_pattern(code)
+    return shape_scores, block_scores, run_lengths, run_edges, white_fours, black_fours
+
+
+# One list read per direction replaces walking the line. Shape and block scores are
+# colour-independent; the four tables differ because black needs an exact five.
+(
+    SHAPE_SCORES,
+    BLOCK_SCORES,
+    RUN_LENGTHS,
+    RUN_EDGES,
+    WHITE_FOURS,
+    BLACK_FOURS,
+) = _build_pattern_tables()
+# Codes that can make a cell a win or four square; all other cells skip the full checks.
+THREAT_CODES = [RUN_LENGTHS[code] >= 5 or WHITE_FOURS[code] for code in range(PATTERN_CODES)]
+
+
+def _build_three_codes():
+    # A cell can only make a three along a line if some five-cell span through
+    # it is free of blocked cells and already holds two own stones.
+    flags = [False] * PATTERN_CODES
+    for code in range(PATTERN_CODES):
+        digits = [(code // POW3[j]) % 3 for j in range(PATTERN_WIDTH)]
+        for start in range(PATTERN_REACH + 1):
+            span = digits[start : start + 5]
+            if PATTERN_BLOCKED not in span and span.count(PATTERN_OWN) >= 2:
+                flags[code] = True
+                break
+    return flags
+
+
+# Prefilter for VCT three moves; candidates are confirmed by open_four_squares.
+THREE_CODES = _build_three_codes()
+# Codes that can make a cell forbidden or a threat for black.
+BLACK_CHECK_CODES = (
+    [threat or three for threat, three in zip(THREAT_CODES, THREE_CODES)] if RENJU_DOUBLE_THREE else THREAT_CODES
+)
+
+
+def _build_threat_zones():
+    # Win and four status of a cell depends on its line window plus one cell of
+    # exact-five look-ahead, so a stone can only change cells within that reach.
+    zones = [()] * BOARD_CELLS
+    for idx in BOARD_INDICES:
+        zone = {idx}
+        for step in STEPS:
+            for k in range(1, PATTERN_REACH + 2):
+                for q in (idx - k * step, idx + k * step):
+                    if q in BOARD_INDEX_SET:
+                        zone.add(q)
+        zones[idx] = frozenset(zone)
+    return zones
+
+
+THREAT_ZONES = _build_threat_zones()
+
+
+def _build_zobrist_keys():
+    # Fixed seed so hashes, and any logged keys, are stable across processes.
+    rng = random.Random(0x5EED0F)
+    keys = [None, [0] * BOARD_CELLS, [0] * BOARD_CELLS]
+    for stone in (BLACK, WHITE):
+        for idx in BOARD_INDICES:
+            keys[stone][idx] = rng.getrandbits(64)
+    return tuple(keys), (0, 0, rng.getrandbits(64))
+
+
+# ZOBRIST_SIDE is xor-ed in by the search for white to move; the board hash itself is side-free.
+ZOBRIST_KEYS, ZOBRIST_SIDE = _build_zobrist_keys()
+
+
+def _build_symmetry_maps():
+    # The eight transforms of symmetry_key, in the same order.
+    n = BOARD_SIZE - 1
+    transforms = (
+        lambda x, y: (x, y),
+        lambda x, y: (y, n - x),
+        lambda x, y: (n - x, n - y),
+        lambda x, y: (n - y, x),
+        lambda x, y: (n - x, y),
+        lambda x, y: (n - y, n - x),
+        lambda x, y: (x, n - y),
+        lambda x, y: (y, x),
+    )
+    maps = []
+    inverses = []
+    for transform in transforms:
+        mapping = [0] * BOARD_CELLS
+        inverse = [0] * BOARD_CELLS
+        for idx in BOARD_INDICES:
+            image = cell_index(*transform(*cell_coords(idx)))
+            mapping[idx] = image
+            inverse[image] = idx
+        maps.append(mapping)
+        inverses.append(inverse)
+    return tuple(maps), tuple(inverses)
+
+
+# SYMMETRY_MAPS[t][idx] is idx under transform t; SYMMETRY_INVERSES[t] undoes it.
+SYMMETRY_MAPS, SYMMETRY_INVERSES = _build_symmetry_maps()
+
+
+class Board:
+    """Padded flat board of small ints with a make/unmake stack.
+
+    `history` lists every occupied cell in placement order, so unmake() pops
+    the most recent stone and the frontier scan only touches real stones.
+    `patterns[stone][d][idx]` is the line-pattern code of idx along STEPS[d]
+    from that stone's point of view, updated in place by make/unmake.
+    `wins[stone]` holds the empty cells where that stone completes a five
+    (exact five for black) and `fours[stone]` the empty cells where it makes
+    a four; both are refreshed only around the changed cell.
+    `forbidden` holds the empty cells where black may not play (see
+    forbidden_reason); they are left out of black's wins and fours.
+    `near1`/`near2` count the stones within radius 1/2 of every cell.
+    `hash` is the 64-bit Zobrist key of the stones on the board.
+    """
+
+    __slots__ = ("cells", "history", "patterns", "wins", "fours", "forbidden", "near1", "near2", "hash")
+
+    def __init__(self):
+        self.cells = [WALL] * BOARD_CELLS
+        for idx in BOARD_INDICES:
+            self.cells[idx] = EMPTY
+        self.history = []
+        self.patterns = (
+            None,
+            [codes[:] for codes in EMPTY_PATTERNS],
+            [codes[:] for codes in EMPTY_PATTERNS],
+        )
+        self.wins = (None, set(), set())
+        self.fours = (None, set(), set())
+        self.forbidden = set()
+        self.near1 = [0] * BOARD_CELLS
+        self.near2 = [0] * BOARD_CELLS
+        self.hash = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        board = cls()
+        for y, row in enumerate(rows[:BOARD_SIZE]):
+            for x, value in enumerate(row[:BOARD_SIZE]):
+                stone = STONE_BY_COLOR.get(value)
+                if stone:
+                    board.make(cell_index(x, y), stone)
+        return board
+
+    def copy(self):
+        clone = Board.__new__(Board)
+        clone.cells = self.cells[:]
+        clone.history = self.history[:]
+        clone.patterns = (
+            None,
+            [codes[:] for codes in self.patterns[BLACK]],
+            [codes[:] for codes in self.patterns[WHITE]],
+        )
+        clone.wins = (None, set(self.wins[BLACK]), set(self.wins[WHITE]))
+        clone.fours = (None, set(self.fours[BLACK]), set(self.fours[WHITE]))
+        clone.forbidden = set(self.forbidden)
+        clone.near1 = self.near1[:]
+        clone.near2 = self.near2[:]
+        clone.hash = self.hash
+        return clone
+
+    def get(self, x, y):
+        return self.cells[cell_index(x, y)]
+
+    def make(self, idx, stone):
+        self.cells[idx] = stone
+        self.history.append(idx)
+        self.hash ^= ZOBRIST_KEYS[stone][idx]
+        self._shift_patterns(idx, stone, 1)
+        self._shift_neighbors(idx, 1)
+        self._refresh_threats(idx)
+
+    def unmake(self):
+        idx = self.history.pop()
+        stone = self.cells[idx]
+        self.cells[idx] = EMPTY
+        self.hash ^= ZOBRIST_KEYS[stone][idx]
+        self._shift_patterns(idx, stone, -1)
+        self._shift_neighbors(idx, -1)
+        self._refresh_threats(idx)
+        return idx
+
+    def _shift_patterns(self, idx, stone, sign):
+        own = self.patterns[stone]
+        other = self.patterns[other_stone(stone)]
+        for d, window in enumerate(LINE_WINDOWS[idx]):
+            own_codes = own[d]
+            other_codes = other[d]
+            for q, weight in zip(window, MIRRORED_POW3):
+                own_codes[q] += sign * weight
+                other_codes[q] += sign * PATTERN_BLOCKED * weight
+
+    def _shift_neighbors(self, idx, sign):
+        near1 = self.near1
+        for n in NEIGHBORHOODS[1][idx]:
+            near1[n] += sign
+        near2 = self.near2
+        for n in NEIGHBORHOODS[2][idx]:
+            near2[n] += sign
+
+    def _refresh_threats(self, idx):
+        cells = self.cells
+        zone = THREAT_ZONES[idx]
+        forbidden = self.forbidden
+        forbidden -= zone
+        for stone in (BLACK, WHITE):
+            wins = self.wins[stone]
+            fours = self.fours[stone]
+            wins -= zone
+            fours -= zone
+            codes = BLACK_CHECK_CODES if stone == BLACK else THREAT_CODES
+            p0, p1, p2, p3 = self.patterns[stone]
+            for q in zone:
+                if cells[q] == EMPTY and (codes[p0[q]] or codes[p1[q]] or codes[p2[q]] or codes[p3[q]]):
+                    if stone == BLACK:
+                        reason, five, four = black_move_status(self, q)
+                        if reason:
+                            forbidden.add(q)
+                        else:
+                            if five:
+                                wins.add(q)
+                            if four:
+                                fours.add(q)
+                        continue
+                    if is_win_after_placing(self, q, stone):
+                        wins.add(q)
+                    if makes_four(self, q, stone):
+                        fours.add(q)
+
+
 def symmetry_key(x, y):
     n = BOARD_SIZE - 1
     transforms = (
@@ -248,72 +876,220 @@ def symmetry_key(x, y):
     return keys[0]
 
 
-def score_to_win_prob(score):
-    scale = OFFER10_LOGIT_SCALE if OFFER10_LOGIT_SCALE > 1 else 26000.0
-    x = max(-60.0, min(60.0, float(score) / float(scale)))
-    return 1.0 / (1.0 + math.exp(-x))
-
+def symmetric_hashes(board):
+    """Return the board's Zobrist key under each SYMMETRY_MAPS transform."""
+    cells = board.cells
+    history = board.history
+    keys = []
+    for mapping in SYMMETRY_MAPS:
+        key = 0
+        for idx in history:
+            key ^= ZOBRIST_KEYS[cells[idx]][mapping[idx]]
+        keys.append(key)
+    return keys
 
-def count_one_side(board, x, y, dx, dy, color):
-    length = 0
-    cx = x + dx
-    cy = y + dy
-    while in_bounds(cx, cy) and board[cy][cx] == color:
-        length += 1
-        cx += dx
-        cy += dy
-    open_end = in_bounds(cx, cy) and board[cy][cx] is None
-    return length, open_end
 
+def canonical_hash(board):
+    """Return (key, t): the smallest Zobrist key of the board over its eight
+    symmetries, and the SYMMETRY_MAPS transform that gives it."""
+    keys = symmetric_hashes(board)
+    key = min(keys)
+    return key, keys.index(key)
 
-def line_stats(board, x, y, dx, dy, color):
-    left, left_open = count_one_side(board, x, y, -dx, -dy, color)
-    right, right_open = count_one_side(board, x, y, dx, dy, color)
-    return left + 1 + right, int(left_open) + int(right_open)
 
+def board_symmetries(board):
+    """Return the transforms other than the identity that map the board onto itself."""
+    keys = symmetric_hashes(board)
+    return [t for t in range(1, len(keys)) if keys[t] == keys[0]]
 
-def is_winning_move(board, x, y, color):
-    if not in_bounds(x, y) or board[y][x] is not None:
-        return False
 
-    board[y][x] = color
-    lengths = [line_stats(board, x, y, dx, dy, color)[0] for dx, dy in DIRECTIONS]
-    board[y][x] = None
+def unique_moves(board, moves, symmetries=None):
+    """Return `moves` without those a board symmetry maps onto an earlier one.
 
-    if color == "black":
-        # Server rule is exact five for black; overline is never a black win.
-        if any(length >= 6 for length in lengths):
-            return False
-        return any(length == 5 for length in lengths)
-    return any(length >= 5 for length in lengths)
+    Symmetric moves lead to equivalent positions, so searching one of them
+    is enough. Order is kept, so a best-first list stays best-first.
+    """
+    if symmetries is None:
+        symmetries = board_symmetries(board) if len(board.history) <= SYMMETRY_MAX_STONES else ()
+    if not symmetries:
+        return moves
+    seen = set()
+    kept = []
+    for idx in moves:
+        if idx in seen:
+            continue
+        kept.append(idx)
+        seen.add(idx)
+        seen.update(SYMMETRY_MAPS[t][idx] for t in symmetries)
+    return kept
 
 
-def is_win_after_placing(board, x, y, color):
-    lengths = [line_stats(board, x, y, dx, dy, color)[0] for dx, dy in DIRECTIONS]
-    if color == "black":
-        if any(length >= 6 for length in lengths):
-            return False
-        return any(length == 5 for length in lengths)
-    return any(length >= 5 for length in lengths)
+def score_to_win_prob(score):
+    scale = OFFER10_LOGIT_SCALE if OFFER10_LOGIT_SCALE > 1 else 26000.0
+    x = max(-60.0, min(60.0, float(score) / float(scale)))
+    return 1.0 / (1.0 + math.exp(-x))
 
 
-def find_immediate_wins(board, color, limit=None):
-    wins = []
-    for y in range(BOARD_SIZE):
-        for x in range(BOARD_SIZE):
-            if board[y][x] is not None:
-                continue
-            if is_winning_move(board, x, y, color):
-                wins.append((x, y))
-                if limit is not None and len(wins) >= limit:
-                    return wins
+def makes_four(board, idx, stone):
+    # Line-local like renju.ts: some empty cell on a line through idx would then
+    # complete a five (exact five for black) that includes idx.
+    patterns = board.patterns[stone]
+    cells = board.cells
+    for d in range(4):
+        code = patterns[d][idx]
+        if stone == WHITE:
+            if WHITE_FOURS[code]:
+                return True
+            continue
+        step = STEPS[d]
+        for checks in BLACK_FOURS[code]:
+            if all(cells[idx + k * step] != BLACK for k in checks):
+                return True
+    return False
+
+
+def black_run_beyond_window(board, idx, step, edge):
+    # A run touching the window end is all on-board, so one step past it is in the array.
+    reach = (PATTERN_REACH + 1) * step
+    cells = board.cells
+    extra = 0
+    if edge & 1 and cells[idx - reach] == BLACK:
+        extra += 1
+    if edge & 2 and cells[idx + reach] == BLACK:
+        extra += 1
+    return extra
+
+
+def is_winning_move(board, idx, stone):
+    if board.cells[idx] != EMPTY:
+        return False
+    return is_win_after_placing(board, idx, stone)
+
+
+def is_win_after_placing(board, idx, stone):
+    # Patterns treat the centre as own, so this also answers for an empty idx.
+    patterns = board.patterns[stone]
+    found = False
+    for d in range(4):
+        code = patterns[d][idx]
+        length = RUN_LENGTHS[code]
+        if stone == BLACK:
+            if length == 5 and RUN_EDGES[code]:
+                length += black_run_beyond_window(board, idx, STEPS[d], RUN_EDGES[code])
+            # Server rule is exact five for black; overline is never a black win.
+            if length >= 6:
+                return False
+            if length == 5:
+                found = True
+        elif length >= 5:
+            return True
+    return found
+
+
+def forbidden_reason(board, idx):
+    """Return why black may not play the empty cell idx, or None.
+
+    Mirrors evaluateMove in packages/shared/src/renju.ts, which checks the
+    board with the stone placed: "overline" for a run of six or more in any
+    direction, "double_four" when two directions each get a square that
+    completes an exact five through idx, and, only with RENJU_DOUBLE_THREE,
+    "double_three" when two other directions can each become a straight four.
+    A forbidden move loses even if it also makes an exact five.
+    """
+    return black_move_status(board, idx)[0]
+
+
+def black_move_status(board, idx):
+    # (forbidden_reason, makes an exact five, makes a four) in one pass over
+    # the four directions, so Board refreshes classify black cells once.
+    patterns = board.patterns[BLACK]
+    cells = board.cells
+    five = False
+    fours = 0
+    quiet = []
+    for d in range(4):
+        code = patterns[d][idx]
+        step = STEPS[d]
+        length = RUN_LENGTHS[code]
+        if length >= 5:
+            if length == 5 and RUN_EDGES[code]:
+                length += black_run_beyond_window(board, idx, step, RUN_EDGES[code])
+            if length >= 6:
+                return "overline", False, False
+            # Any other square on a five's line would make it six or more.
+            five = True
+            continue
+        for checks in BLACK_FOURS[code]:
+            if all(cells[idx + k * step] != BLACK for k in checks):
+                fours += 1
+                break
+        else:
+            quiet.append(d)
+    if fours >= 2:
+        return "double_four", False, False
+    if RENJU_DOUBLE_THREE and len(quiet) >= 2:
+        threes = 0
+        for d in quiet:
+            if makes_straight_four_line(board, idx, d):
+                threes += 1
+                if threes >= 2:
+                    return "double_three", False, False
+    return None, five, fours > 0
+
+
+def makes_straight_four_line(board, idx, d):
+    # A three along STEPS[d]: one more black stone in idx's window would leave
+    # two squares that each complete an exact five through idx.
+    code = board.patterns[BLACK][d][idx]
+    if not THREE_CODES[code]:
+        return False
+    cells = board.cells
+    step = STEPS[d]
+    for j in range(PATTERN_WIDTH):
+        if j == PATTERN_REACH or cells[idx + (j - PATTERN_REACH) * step] != EMPTY:
+            continue
+        fives = 0
+        for checks in BLACK_FOURS[code + POW3[j]]:
+            if all(cells[idx + k * step] != BLACK for k in checks):
+                fives += 1
+        if fives >= 2:
+            return True
+    return False
+
+
+def drop_forbidden(board, moves, stone):
+    """Return `moves` without the cells renju forbids `stone`; white is never restricted."""
+    forbidden = board.forbidden
+    if stone != BLACK or not forbidden:
+        return moves
+    return [idx for idx in moves if idx not in forbidden]
+
+
+def find_immediate_wins(board, stone, limit=None):
+    wins = sorted(board.wins[stone])
+    if limit is not None:
+        return wins[:limit]
     return wins
 
 
+def count_immediate_wins(board, stone, limit=None):
+    count = len(board.wins[stone])
+    if limit is not None:
+        return min(count, limit)
+    return count
+
+
+def find_four_moves(board, stone):
+    return sorted(board.fours[stone])
+
+
 def center_score(x, y):
     return (14 - (abs(x - CENTER) + abs(y - CENTER))) * 3
 
 
+CENTER_SCORES = [center_score(*cell_coords(idx)) for idx in range(BOARD_CELLS)]
+
+
 def stable_move_key(move):
     x = move["x"]
     y = move["y"]
@@ -367,6 +1143,18 @@ def get_expected_mover_agent_id(game):
     return None
 
 
+def get_acting_agent_id(game):
+    # Mirrors the server's required-action rules: who must swap, select or move next.
+    if game.get("status") != "active":
+        return None
+    opening_state = game.get("opening_state") or {}
+    if opening_state.get("awaiting_offer10_selection"):
+        return opening_state.get("tentative_white_agent_id")
+    if opening_state.get("awaiting_swap"):
+        return get_swap_decider_agent_id(game)
+    return get_expected_mover_agent_id(game)
+
+
 def projected_turn_color_after_swap(game, do_swap):
     last_move = int(game.get("move_number", 0))
     next_move = last_move + 1
@@ -407,218 +1195,1339 @@ def pick_ranked_move(scored_moves):
     return pool[-1][1]
 
 
-def neighborhood_stones(board, x, y, radius=2):
-    stones = 0
-    for ny in range(max(0, y - radius), min(BOARD_SIZE, y + radius + 1)):
-        for nx in range(max(0, x - radius), min(BOARD_SIZE, x + radius + 1)):
-            if nx == x and ny == y:
-                continue
-            if board[ny][nx] is not None:
-                stones += 1
-    return stones
+def pick_ranked_index(scored_indices):
+    return pick_ranked_move([(score, move_dict(idx)) for score, idx in scored_indices])
 
 
-def blocking_threat_score(board, x, y, opponent_color):
-    score = 0
-    for dx, dy in DIRECTIONS:
-        left, left_open = count_one_side(board, x, y, -dx, -dy, opponent_color)
-        right, right_open = count_one_side(board, x, y, dx, dy, opponent_color)
-        span = left + right
-        open_ends = int(left_open) + int(right_open)
-        if span >= 4:
-            score += 12000
-        elif span == 3:
-            score += 2500 if open_ends >= 1 else 500
-        elif span == 2 and open_ends == 2:
-            score += 300
-    return score
+def neighborhood_stones(board, idx, radius=2):
+    if radius == 1:
+        return board.near1[idx]
+    return board.near2[idx]
+
+
+class EvalShare:
+    """Work that several evaluations of one position can reuse.
+
+    `frontier` is collect_frontier_moves(radius=2) and `threats` memoizes the
+    fork check of find_forcing_threats by (stone, idx).
+    """
+
+    __slots__ = ("frontier", "threats")
+
+    def __init__(self, frontier):
+        self.frontier = frontier
+        self.threats = {}
+
+
+def blocking_threat_score(board, idx, opponent_stone):
+    p0, p1, p2, p3 = board.patterns[opponent_stone]
+    return BLOCK_SCORES[p0[idx]] + BLOCK_SCORES[p1[idx]] + BLOCK_SCORES[p2[idx]] + BLOCK_SCORES[p3[idx]]
+
 
+def own_shape_score(board, idx, stone):
+    p0, p1, p2, p3 = board.patterns[stone]
+    return SHAPE_SCORES[p0[idx]] + SHAPE_SCORES[p1[idx]] + SHAPE_SCORES[p2[idx]] + SHAPE_SCORES[p3[idx]]
 
-def own_shape_score(board, x, y, color):
+
+def _build_numpy_tables():
+    if not NUMPY_ENABLED:
+        return None
+    positions = np.full(BOARD_CELLS, -1, dtype=np.int64)
+    positions[list(BOARD_INDICES)] = np.arange(len(BOARD_INDICES))
+    return {
+        "indices": np.array(BOARD_INDICES, dtype=np.int64),
+        "positions": positions,
+        "block": np.array(BLOCK_SCORES, dtype=np.int64),
+        "center": np.array([CENTER_SCORES[idx] for idx in BOARD_INDICES], dtype=np.int64),
+    }
+
+
+# Arrays below are in BOARD_INDICES order; "positions" maps an array cell to that order.
+NUMPY_TABLES = _build_numpy_tables()
+
+
+def numpy_pattern_scores(board, stone, table):
+    codes = np.array(board.patterns[stone], dtype=np.int64)[:, NUMPY_TABLES["indices"]]
+    return table[codes].sum(axis=0)
+
+
+def numpy_heatmaps(board, opponent_stone):
+    """Whole-board shortlist inputs: (base score, radius-1 count, empty mask).
+
+    The base score is blocking_threat_score + 16 * radius-2 neighbours +
+    centre score, so one pass covers every empty cell at once.
+    """
+    tables = NUMPY_TABLES
+    indices = tables["indices"]
+    cells = np.array(board.cells, dtype=np.int64)[indices]
+    near1 = np.array(board.near1, dtype=np.int64)[indices]
+    near2 = np.array(board.near2, dtype=np.int64)[indices]
+    base = numpy_pattern_scores(board, opponent_stone, tables["block"]) + near2 * 16 + tables["center"]
+    return base, near1, near2, cells == EMPTY
+
+
+def numpy_shortlist(moves, limit, base, near1):
+    # Same order as the Python path: score, then radius-1 count, then smaller index.
+    moves = np.asarray(moves, dtype=np.int64)
+    pos = NUMPY_TABLES["positions"][moves]
+    keys = ((base[pos] * 16 + near1[pos]) * 512) + (511 - moves)
+    if limit < len(moves):
+        top = np.argpartition(-keys, limit - 1)[:limit]
+    else:
+        top = np.arange(len(moves))
+    top = top[np.argsort(-keys[top])]
+    return moves[top].tolist()
+
+
+def numpy_frontier_score(board, perspective_stone, opponent_stone):
+    base, near1, near2, empty = numpy_heatmaps(board, opponent_stone)
+    frontier = NUMPY_TABLES["indices"][empty & (near2 > 0)]
     score = 0
-    for dx, dy in DIRECTIONS:
-        length, open_ends = line_stats(board, x, y, dx, dy, color)
-        if length >= 5:
-            score += 50000
-        elif length == 4:
-            score += 6000 if open_ends == 2 else 1200
-        elif length == 3:
-            score += 700 if open_ends == 2 else 130
-        elif length == 2 and open_ends == 2:
-            score += 50
+    # Only 16 cells survive the shortlist, so plain table reads beat more arrays.
+    for idx in numpy_shortlist(frontier, 16, base, near1):
+        score += blocking_threat_score(board, idx, opponent_stone) // 6
+        score += own_shape_score(board, idx, perspective_stone) // 6
+        score -= own_shape_score(board, idx, opponent_stone) // 7
     return score
 
 
-def shortlist_moves(board, legal, opponent_color, limit=48):
+def shortlist_moves(board, legal, opponent_stone, limit=48):
     if len(legal) <= limit:
         return legal
 
+    if NUMPY_ENABLED and len(legal) >= NUMPY_MIN_MOVES:
+        base, near1, _, _ = numpy_heatmaps(board, opponent_stone)
+        return numpy_shortlist(legal, limit, base, near1)
+
+    near1 = board.near1
+    near2 = board.near2
     scored = []
-    for move in legal:
-        x = move["x"]
-        y = move["y"]
-        score = (
-            blocking_threat_score(board, x, y, opponent_color)
-            + neighborhood_stones(board, x, y, radius=2) * 16
-            + center_score(x, y)
-        )
-        scored.append((score, neighborhood_stones(board, x, y, radius=1), -y, -x, move))
-    scored.sort(key=lambda item: (item[0], item[1], item[2], item[3]), reverse=True)
-    return [item[4] for item in scored[:limit]]
+    for idx in legal:
+        score = blocking_threat_score(board, idx, opponent_stone) + near2[idx] * 16 + CENTER_SCORES[idx]
+        # Ties prefer more adjacent stones, then the smaller (y, x), i.e. the smaller index.
+        scored.append((score, near1[idx], -idx))
+    scored.sort(reverse=True)
+    return [-item[2] for item in scored[:limit]]
 
 
-def score_move(board, move, color):
-    x = move["x"]
-    y = move["y"]
-    opponent_color = opposite(color)
+def score_move(board, idx, stone):
+    opponent_stone = other_stone(stone)
 
-    block_score = blocking_threat_score(board, x, y, opponent_color)
+    block_score = blocking_threat_score(board, idx, opponent_stone)
 
-    board[y][x] = color
-    own_score = own_shape_score(board, x, y, color)
-    own_next_wins = len(find_immediate_wins(board, color, limit=3))
-    opp_next_wins = len(find_immediate_wins(board, opponent_color, limit=3))
-    board[y][x] = None
+    board.make(idx, stone)
+    own_score = own_shape_score(board, idx, stone)
+    own_next_wins = count_immediate_wins(board, stone, limit=3)
+    opp_next_wins = count_immediate_wins(board, opponent_stone, limit=3)
+    board.unmake()
 
     return (
         own_score
         + own_next_wins * 4200
         - opp_next_wins * 7800
         + block_score
-        + neighborhood_stones(board, x, y, radius=2) * 18
-        + center_score(x, y)
+        + neighborhood_stones(board, idx, radius=2) * 18
+        + CENTER_SCORES[idx]
     )
 
 
-def best_scored_move(board, moves, color):
+def best_scored_move(board, moves, stone):
     scored = []
-    for move in moves:
-        score = score_move(board, move, color)
-        scored.append((score, move))
-    return pick_ranked_move(scored)
+    for idx in moves:
+        score = score_move(board, idx, stone)
+        scored.append((score, idx))
+    return pick_ranked_index(scored)
 
 
 def collect_frontier_moves(board, radius=2):
-    seen = set()
-    has_stone = False
-    for y in range(BOARD_SIZE):
-        for x in range(BOARD_SIZE):
-            if board[y][x] is None:
-                continue
-            has_stone = True
-            for ny in range(max(0, y - radius), min(BOARD_SIZE, y + radius + 1)):
-                for nx in range(max(0, x - radius), min(BOARD_SIZE, x + radius + 1)):
-                    if board[ny][nx] is not None:
-                        continue
-                    seen.add((nx, ny))
-    if not has_stone:
-        return [{"x": CENTER, "y": CENTER}]
-    return [{"x": x, "y": y} for (x, y) in seen]
+    if not board.history:
+        return [CENTER_INDEX]
+    cells = board.cells
+    near = board.near1 if radius == 1 else board.near2
+    return [idx for idx in BOARD_INDICES if near[idx] and cells[idx] == EMPTY]
 
 
-def quick_position_score(board, perspective_color):
-    opponent_color = opposite(perspective_color)
-    my_now = len(find_immediate_wins(board, perspective_color, limit=2))
-    opp_now = len(find_immediate_wins(board, opponent_color, limit=2))
+def quick_position_score(board, perspective_stone, share=None):
+    opponent_stone = other_stone(perspective_stone)
+    my_now = count_immediate_wins(board, perspective_stone, limit=2)
+    opp_now = count_immediate_wins(board, opponent_stone, limit=2)
     score = my_now * 12000 - opp_now * 14500
 
-    frontier = collect_frontier_moves(board, radius=2)
-    frontier = shortlist_moves(board, frontier, opponent_color, limit=16)
-    for m in frontier:
-        x = m["x"]
-        y = m["y"]
-        score += blocking_threat_score(board, x, y, opponent_color) // 6
-
-        board[y][x] = perspective_color
-        score += own_shape_score(board, x, y, perspective_color) // 6
-        board[y][x] = None
-
-        board[y][x] = opponent_color
-        score -= own_shape_score(board, x, y, opponent_color) // 7
-        board[y][x] = None
+    if share is not None:
+        frontier = share.frontier
+    elif NUMPY_ENABLED and len(board.history) >= NUMPY_MIN_STONES:
+        return score + numpy_frontier_score(board, perspective_stone, opponent_stone)
+    else:
+        frontier = collect_frontier_moves(board, radius=2)
+    frontier = shortlist_moves(board, frontier, opponent_stone, limit=16)
+    for idx in frontier:
+        score += blocking_threat_score(board, idx, opponent_stone) // 6
+        # Shape lookups treat idx as already holding the stone, so no make/unmake.
+        score += own_shape_score(board, idx, perspective_stone) // 6
+        score -= own_shape_score(board, idx, opponent_stone) // 7
     return score
 
 
-def eval_candidate_with_lookahead(board, move, my_color, depth):
-    x = move["x"]
-    y = move["y"]
-    opponent_color = opposite(my_color)
+def eval_candidate_with_lookahead(board, idx, my_stone, depth):
+    opponent_stone = other_stone(my_stone)
 
-    board[y][x] = my_color
-    if is_win_after_placing(board, x, y, my_color):
-        board[y][x] = None
+    board.make(idx, my_stone)
+    if is_win_after_placing(board, idx, my_stone):
+        board.unmake()
         return 1_000_000
 
-    base = quick_position_score(board, my_color)
+    base = quick_position_score(board, my_stone)
 
     if depth <= 1:
-        board[y][x] = None
+        board.unmake()
         return base
 
-    opponent_moves = collect_frontier_moves(board, radius=2)
+    opponent_moves = drop_forbidden(board, collect_frontier_moves(board, radius=2), opponent_stone)
     opponent_moves = shortlist_moves(
         board,
         opponent_moves,
-        my_color,
+        my_stone,
         limit=REPLY_CANDIDATES,
     )
 
     if not opponent_moves:
-        board[y][x] = None
+        board.unmake()
         return base
 
+    cells = board.cells
     worst_case = None
     for reply in opponent_moves:
-        rx = reply["x"]
-        ry = reply["y"]
-        if board[ry][rx] is not None:
+        if cells[reply] != EMPTY:
             continue
 
-        board[ry][rx] = opponent_color
-        if is_win_after_placing(board, rx, ry, opponent_color):
+        board.make(reply, opponent_stone)
+        if is_win_after_placing(board, reply, opponent_stone):
             val = -900_000
         else:
             tactical = (
-                len(find_immediate_wins(board, my_color, limit=2)) * 9000
-                - len(find_immediate_wins(board, opponent_color, limit=2)) * 12000
+                count_immediate_wins(board, my_stone, limit=2) * 9000
+                - count_immediate_wins(board, opponent_stone, limit=2) * 12000
             )
-            val = tactical + quick_position_score(board, my_color)
-        board[ry][rx] = None
+            val = tactical + quick_position_score(board, my_stone)
+        board.unmake()
 
         if worst_case is None or val < worst_case:
             worst_case = val
 
-    board[y][x] = None
+    board.unmake()
     if worst_case is None:
         return base
     return int(base * 0.35 + worst_case * 0.65)
 
 
-def best_move_with_lookahead(board, moves, color, depth):
+def best_move_with_lookahead(board, moves, stone, depth, deadline=None):
+    # Candidates arrive best-first from shortlist_moves, so stopping at the
+    # deadline still ranks the most promising ones.
     scored = []
-    for move in moves:
-        score = eval_candidate_with_lookahead(board, move, color, depth)
-        scored.append((score, move))
-    return pick_ranked_move(scored)
+    for idx in moves:
+        if deadline is not None and scored and time.perf_counter() > deadline:
+            break
+        score = eval_candidate_with_lookahead(board, idx, stone, depth)
+        scored.append((score, idx))
+    return pick_ranked_index(scored)
+
+
+def open_four_squares(board, stone):
+    """Return the cells where `stone` would get two or more five squares at once."""
+    found = []
+    for idx in sorted(board.fours[stone]):
+        board.make(idx, stone)
+        if len(board.wins[stone]) >= 2:
+            found.append(idx)
+        board.unmake()
+    return found
+
+
+def three_defences(board, attacker, open_fours):
+    """Return the defender's replies to a three: every cell that removes all of
+    the attacker's open-four squares, plus the defender's own fours.
+
+    Only an open-four square or one of the five squares it would create can
+    stop that open four, so those are the only cells tried.
+    """
+    defender = other_stone(attacker)
+    cells = board.cells
+    counter_fours = board.fours[defender]
+    zone = set(counter_fours)
+    for idx in open_fours:
+        zone.add(idx)
+        board.make(idx, attacker)
+        zone.update(board.wins[attacker])
+        board.unmake()
+    replies = []
+    for idx in drop_forbidden(board, sorted(zone), defender):
+        if cells[idx] != EMPTY:
+            continue
+        if idx in counter_fours:
+            replies.append(idx)
+            continue
+        board.make(idx, defender)
+        if not open_four_squares(board, attacker):
+            replies.append(idx)
+        board.unmake()
+    return replies
+
+
+def cached_open_fours(board, stone, memo):
+    if memo is None:
+        return open_four_squares(board, stone)
+    key = board.hash ^ ZOBRIST_SIDE[stone]
+    found = memo.get(key)
+    if found is None:
+        found = memo[key] = open_four_squares(board, stone)
+    return found
+
+
+def generate_moves(board, stone, width, memo=None, symmetries=None):
+    """Return candidate moves for `stone`, narrowed to the forced ones when possible.
+
+    A win is returned alone, a five threat allows only its blocks, and an
+    opponent three allows only three_defences. Quiet positions fall back to
+    the positional shortlist. On boards with a symmetry only one move of
+    each symmetric set is kept; `symmetries` passes board_symmetries when
+    the caller already has it. `memo` caches open-four squares by position.
+    Cells forbidden to black are never returned for black; when every block
+    is forbidden the shortlist is returned and the search finds the loss.
+    """
+    wins = board.wins[stone]
+    if wins:
+        return [min(wins)]
+    opponent_stone = other_stone(stone)
+    opponent_wins = board.wins[opponent_stone]
+    if opponent_wins:
+        blocks = drop_forbidden(board, sorted(opponent_wins), stone)
+        if blocks:
+            return blocks
+    else:
+        open_fours = cached_open_fours(board, opponent_stone, memo)
+        if open_fours:
+            defences = unique_moves(board, three_defences(board, opponent_stone, open_fours), symmetries)
+            if defences:
+                return shortlist_moves(board, defences, opponent_stone, limit=len(defences))
+    frontier = unique_moves(board, drop_forbidden(board, collect_frontier_moves(board, radius=2), stone), symmetries)
+    return shortlist_moves(board, frontier, opponent_stone, limit=width)
+
+
+WIN_SCORE = 10_000_000
+MAX_PLY = 128
+
+
+class TimeManager:
+    """Budget for one move, taken from the server's turn clock.
+
+    `soft` is when an anytime search stops starting new iterations and
+    `hard` when it must return; both are perf_counter() times. Without a
+    clock the budget is `base_ms`, with room to extend on hard positions.
+    A share of the remaining turn (at most TIME_SAFETY_MS, at most a third
+    for short clocks) is always kept back for the network round trip.
+    """
+
+    def __init__(self, left_ms=None, base_ms=SEARCH_TIME_MS, extend=TIME_EXTEND_FACTOR):
+        self.start = time.perf_counter()
+        if left_ms is None:
+            soft_ms = base_ms
+            hard_ms = base_ms * extend
+        else:
+            usable = max(0.0, left_ms - min(TIME_SAFETY_MS, left_ms / 3.0))
+            soft_ms = min(base_ms, usable * TIME_MOVE_FRACTION)
+            hard_ms = min(soft_ms * extend, usable)
+        self.soft = self.start + soft_ms / 1000.0
+        self.hard = self.start + hard_ms / 1000.0
+
+    @classmethod
+    def fixed(cls, ms):
+        return cls(None, base_ms=ms, extend=1.0)
+
+    @classmethod
+    def from_game(cls, game, base_ms=SEARCH_TIME_MS):
+        return cls(turn_time_left_ms(game), base_ms=base_ms)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000.0
+
+    def soft_left_ms(self):
+        return max(0.0, (self.soft - time.perf_counter()) * 1000.0)
+
+    def expired(self):
+        return time.perf_counter() >= self.hard
+
+    def past(self, extension=0.0):
+        """True once the soft limit, moved `extension` of the way to hard, has passed."""
+        return time.perf_counter() >= self.soft + (self.hard - self.soft) * extension
+
+    def credit(self, ms):
+        """Pull the soft limit in by up to half its budget for time already spent elsewhere."""
+        budget = self.soft - self.start
+        self.soft -= min(ms / 1000.0, budget / 2.0)
+
+    def cancel(self):
+        # Searches poll `hard`, so this stops them from another thread.
+        self.soft = self.hard = 0.0
+
+
+def turn_time_left_ms(game):
+    left = game.get("turn_time_left_ms")
+    if left is not None:
+        try:
+            return max(0.0, float(left))
+        except (TypeError, ValueError):
+            pass
+    deadline = game.get("turn_deadline_at")
+    if deadline:
+        try:
+            stamp = datetime.datetime.fromisoformat(str(deadline).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return max(0.0, (stamp.timestamp() - time.time()) * 1000.0)
+    return None
+
+
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size, always-allocated hash table of search results.
+
+    Slots hold (key, depth, score, bound, move, generation) tuples. A store
+    replaces the slot when it is empty, holds the same position, was written
+    in an earlier generation (turn), or was searched no deeper. Mate scores
+    are kept relative to the stored node so they stay valid from any ply.
+    """
+
+    def __init__(self, bits=TT_BITS):
+        self.mask = (1 << bits) - 1
+        self.slots = [None] * (1 << bits)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, score, bound, move):
+        slot = key & self.mask
+        entry = self.slots[slot]
+        if entry is not None and entry[0] != key:
+            if entry[5] == self.generation and entry[1] > depth:
+                self.rejected += 1
+                return
+            self.overwrites += 1
+        self.stores += 1
+        self.slots[slot] = (key, depth, score, bound, move, self.generation)
+
+    def stats(self):
+        used = sum(1 for entry in self.slots if entry is not None)
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.probes, 4) if self.probes else 0.0,
+            "cutoffs": self.cutoffs,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "rejected": self.rejected,
+            "fill": round(used / len(self.slots), 4),
+        }
+
+
+class SharedTranspositionTable:
+    """TranspositionTable backed by an mmap'd file shared by all processes.
+
+    Each 16-byte slot holds two native-endian uint64 words (the file is
+    only shared on one host): `check` and `data`, with check = key ^ data. Writers store both words without a
+    lock; a reader only accepts a slot whose check ^ data equals the probed
+    key, so a torn or concurrent write reads as a miss instead of a wrong
+    entry. `data` packs score (32 bits), depth (8), bound (2), move (10) and
+    a generation (8) taken from a 16-second clock, since processes do not
+    share turn counters, and always has its top bit set: an unused all-zero
+    slot would otherwise pass the check for key 0. Replacement follows
+    TranspositionTable.
+    """
+
+    SLOT_BYTES = 16
+    NO_MOVE = 0x3FF
+    USED = 1 << 63
+
+    def __init__(self, path=SHARED_TT_PATH, megabytes=SHARED_TT_MB):
+        size = megabytes * 1024 * 1024
+        slots = 1 << ((size // self.SLOT_BYTES).bit_length() - 1)
+        size = slots * self.SLOT_BYTES
+        with open(path, "a+b") as handle:
+            if os.fstat(handle.fileno()).st_size < size:
+                handle.truncate(size)
+            self.map = mmap.mmap(handle.fileno(), size)
+        self.words = memoryview(self.map).cast("Q")
+        self.mask = slots - 1
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def new_search(self):
+        self.generation = (int(time.time()) >> 4) & 0xFF
+
+    def probe(self, key):
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        words = self.words
+        check = words[slot]
+        data = words[slot + 1]
+        if not data & self.USED or check ^ data != key:
+            return None
+        self.hits += 1
+        score = data & 0xFFFFFFFF
+        if score >= 1 << 31:
+            score -= 1 << 32
+        move = (data >> 42) & self.NO_MOVE
+        return (
+            key,
+            (data >> 32) & 0xFF,
+            score,
+            (data >> 40) & 0x3,
+            None if move == self.NO_MOVE else move,
+            (data >> 52) & 0xFF,
+        )
+
+    def store(self, key, depth, score, bound, move):
+        slot = (key & self.mask) << 1
+        words = self.words
+        old_data = words[slot + 1]
+        old_key = words[slot] ^ old_data
+        if old_data and old_key != key:
+            if (old_data >> 52) & 0xFF == self.generation and (old_data >> 32) & 0xFF > depth:
+                self.rejected += 1
+                return
+            self.overwrites += 1
+        data = (
+            (score & 0xFFFFFFFF)
+            | (min(depth, 0xFF) << 32)
+            | (bound << 40)
+            | ((self.NO_MOVE if move is None else move) << 42)
+            | (self.generation << 52)
+            | self.USED
+        )
+        self.stores += 1
+        words[slot] = key ^ data
+        words[slot + 1] = data
+
+    def stats(self):
+        sample = min(self.mask + 1, 4096)
+        used = sum(1 for slot in range(sample) if self.words[2 * slot + 1])
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.probes, 4) if self.probes else 0.0,
+            "cutoffs": self.cutoffs,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "rejected": self.rejected,
+            "fill": round(used / sample, 4),
+        }
+
+
+def new_transposition_table():
+    """Return the host-shared table when SHARED_TT_PATH is set, else a private one."""
+    if SHARED_TT_PATH:
+        return SharedTranspositionTable()
+    return TranspositionTable()
+
+
+def score_to_tt(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= WIN_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -(WIN_SCORE - MAX_PLY):
+        return score + ply
+    return score
 
 
-def find_forcing_threats(board, color, probe_moves, max_found=40):
+class MoveOrdering:
+    """Killer, history and counter-move tables for NegamaxSearch.
+
+    `killers[ply]` holds the last two moves that caused a beta cutoff at that
+    ply, `history[stone][idx]` accumulates depth * depth for cutoff moves,
+    and `counters[stone][prev]` remembers the cutoff reply to the previous
+    move. History and counter moves survive between turns (history is halved
+    each search); killers are cleared. The *_tries/*_best counters report
+    how often a table's suggestion was available and turned out best.
+    """
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = (None, [0] * BOARD_CELLS, [0] * BOARD_CELLS)
+        self.counters = (None, [None] * BOARD_CELLS, [None] * BOARD_CELLS)
+        self.searched = 0
+        self.first_best = 0
+        self.tt_tries = 0
+        self.tt_best = 0
+        self.killer_tries = 0
+        self.killer_best = 0
+        self.counter_tries = 0
+        self.counter_best = 0
+
+    def new_search(self):
+        for slot in self.killers:
+            slot[0] = slot[1] = None
+        for stone in (BLACK, WHITE):
+            history = self.history[stone]
+            for idx in BOARD_INDICES:
+                history[idx] >>= 1
+
+    def order(self, moves, stone, ply, tt_move, prev):
+        """Return `moves` as: TT move, killers, counter move, then by history."""
+        history = self.history[stone]
+        rest = sorted(moves, key=lambda idx: -history[idx])
+        front = []
+        killers = self.killers[ply]
+        counter = self.counters[stone][prev] if prev is not None else None
+        for idx in (tt_move, killers[0], killers[1], counter):
+            if idx is not None and idx not in front and idx in moves:
+                front.append(idx)
+        if not front:
+            return rest
+        return front + [idx for idx in rest if idx not in front]
+
+    def record(self, stone, ply, depth, idx, first, tt_move, prev, cutoff):
+        self.searched += 1
+        if idx == first:
+            self.first_best += 1
+        killers = self.killers[ply]
+        counters = self.counters[stone]
+        counter = counters[prev] if prev is not None else None
+        if tt_move is not None:
+            self.tt_tries += 1
+            self.tt_best += idx == tt_move
+        if killers[0] is not None:
+            self.killer_tries += 1
+            self.killer_best += idx in killers
+        if counter is not None:
+            self.counter_tries += 1
+            self.counter_best += idx == counter
+        if not cutoff:
+            return
+        if killers[0] != idx:
+            killers[1] = killers[0]
+            killers[0] = idx
+        self.history[stone][idx] += depth * depth
+        if prev is not None:
+            counters[prev] = idx
+
+    def stats(self):
+        def rate(hits, tries):
+            return round(hits / tries, 4) if tries else 0.0
+
+        return {
+            "searched": self.searched,
+            "first_best_rate": rate(self.first_best, self.searched),
+            "tt_best_rate": rate(self.tt_best, self.tt_tries),
+            "killer_best_rate": rate(self.killer_best, self.killer_tries),
+            "counter_best_rate": rate(self.counter_best, self.counter_tries),
+        }
+
+
+class NegamaxSearch:
+    """Iterative-deepening alpha-beta (negamax) over generate_moves.
+
+    Scores are from the side to move; WIN_SCORE - ply marks a forced five.
+    Leaves are extended by a quiescence search over fours and three
+    defences, so the static score is only taken in quiet positions.
+    Each iteration re-orders the root by the previous one. The search is
+    anytime: it stops starting iterations at the clock's soft limit (later
+    when the best move just changed or the root is tactical) and aborts at
+    the hard limit, keeping the best root move found so far. Pass the same
+    `table` and `ordering` on every turn to reuse results and move ordering
+    statistics from earlier searches.
+    """
+
+    def __init__(
+        self,
+        board,
+        time_ms=SEARCH_TIME_MS,
+        max_depth=SEARCH_MAX_DEPTH,
+        width=SEARCH_WIDTH,
+        table=None,
+        ordering=None,
+        clock=None,
+    ):
+        self.table = table if table is not None else new_transposition_table()
+        self.table.new_search()
+        self.ordering = ordering if ordering is not None else MoveOrdering()
+        self.ordering.new_search()
+        self.width = width
+        self.max_depth = max_depth
+        self.open_fours = {}
+        self.rebind(board, clock if clock is not None else TimeManager.fixed(time_ms))
+
+    def rebind(self, board, clock):
+        """Search `board` against `clock` next, without aging the table or ordering."""
+        self.board = board
+        self.clock = clock
+        self.nodes = 0
+        self.depth_reached = 0
+        self.partial = []
+
+    def search(self, stone, root_moves):
+        board = self.board
+        base_len = len(board.history)
+        if not root_moves:
+            return None, 0
+        key, t, _ = self._table_key(stone)
+        tt_move = self._probe_move(self.table.probe(key), t)
+        prev = board.history[-1] if board.history else None
+        order = self.ordering.order(root_moves, stone, 0, tt_move, prev)
+        opponent_stone = other_stone(stone)
+        tactical = bool(board.fours[stone] or board.fours[opponent_stone] or board.wins[opponent_stone])
+        best_idx, best_score = order[0], 0
+        for depth in range(1, self.max_depth + 1):
+            started = time.perf_counter()
+            try:
+                scored = self._search_root(stone, order, depth)
+            except SearchTimeout:
+                while len(board.history) > base_len:
+                    board.unmake()
+                # The previous best is searched first, so any move that beat it
+                # in the unfinished iteration is a better best-so-far.
+                if self.partial and max(self.partial)[0] > self.partial[0][0]:
+                    best_score, best_idx = max(self.partial, key=lambda item: item[0])
+                break
+            previous = best_idx
+            # Stable sort: among equal scores the previous order is kept.
+            scored.sort(key=lambda item: -item[0])
+            order = [idx for _, idx in scored]
+            best_score, best_idx = scored[0]
+            self.depth_reached = depth
+            self.table.store(key, depth, score_to_tt(best_score, 0), TT_EXACT, SYMMETRY_MAPS[t][best_idx])
+            if abs(best_score) >= WIN_SCORE - MAX_PLY:
+                break
+            extension = 0.0
+            if depth > 1 and best_idx != previous:
+                extension += 0.5
+            if tactical:
+                extension += 0.25
+            if self.clock.past(extension):
+                break
+            # The next iteration costs a few times this one; skip it if it
+            # could not finish before the hard limit anyway.
+            now = time.perf_counter()
+            if now + 2 * (now - started) > self.clock.hard:
+                break
+        return best_idx, best_score
+
+    def _search_root(self, stone, moves, depth):
+        opponent_stone = other_stone(stone)
+        alpha = -WIN_SCORE - 1
+        scored = self.partial = []
+        for idx in moves:
+            self.board.make(idx, stone)
+            score = -self._negamax(opponent_stone, depth - 1, -WIN_SCORE - 1, -alpha, 1)
+            self.board.unmake()
+            scored.append((score, idx))
+            if score > alpha:
+                alpha = score
+        return scored
+
+    def score_root_move(self, stone, idx, depth, alpha=-WIN_SCORE - 1):
+        """Score one root move at `depth`; results at or below `alpha` are upper bounds."""
+        board = self.board
+        base_len = len(board.history)
+        board.make(idx, stone)
+        try:
+            return -self._negamax(other_stone(stone), depth - 1, -WIN_SCORE - 1, -alpha, 1)
+        finally:
+            while len(board.history) > base_len:
+                board.unmake()
+
+    def _negamax(self, stone, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and time.perf_counter() > self.clock.hard:
+            raise SearchTimeout()
+
+        board = self.board
+        opponent_stone = other_stone(stone)
+        if board.wins[stone]:
+            return WIN_SCORE - ply
+        opponent_wins = board.wins[opponent_stone]
+        if len(opponent_wins) >= 2:
+            # Only one of two five-completing squares can be blocked.
+            return -(WIN_SCORE - ply - 1)
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(stone, alpha, beta, ply, QUIESCENCE_DEPTH)
+
+        table = self.table
+        key, t, symmetries = self._table_key(stone)
+        entry = table.probe(key)
+        tt_move = None
+        if entry is not None:
+            tt_move = self._probe_move(entry, t)
+            if entry[1] >= depth:
+                score = score_from_tt(entry[2], ply)
+                bound = entry[3]
+                if (
+                    bound == TT_EXACT
+                    or (bound == TT_LOWER and score >= beta)
+                    or (bound == TT_UPPER and score <= alpha)
+                ):
+                    table.cutoffs += 1
+                    return score
+
+        moves = generate_moves(board, stone, self.width, self.open_fours, symmetries)
+        if not moves:
+            return 0
+        prev = board.history[-1] if board.history else None
+        moves = self.ordering.order(moves, stone, ply, tt_move, prev)
+
+        alpha_start = alpha
+        best = -WIN_SCORE - 1
+        best_idx = moves[0]
+        for idx in moves:
+            board.make(idx, stone)
+            score = -self._negamax(opponent_stone, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake()
+            if score > best:
+                best = score
+                best_idx = idx
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best <= alpha_start:
+            bound = TT_UPPER
+        elif best >= beta:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        self.ordering.record(stone, ply, depth, best_idx, moves[0], tt_move, prev, bound == TT_LOWER)
+        table.store(key, depth, score_to_tt(best, ply), bound, SYMMETRY_MAPS[t][best_idx])
+        return best
+
+    def _table_key(self, stone):
+        # Small boards share entries with their symmetric images: the key is
+        # canonical and t is the transform that maps moves into it. The
+        # board's own symmetries come from the same hashes.
+        board = self.board
+        if len(board.history) <= SYMMETRY_MAX_STONES:
+            keys = symmetric_hashes(board)
+            key = min(keys)
+            symmetries = [t for t in range(1, len(keys)) if keys[t] == keys[0]]
+            return key ^ ZOBRIST_SIDE[stone], keys.index(key), symmetries
+        return board.hash ^ ZOBRIST_SIDE[stone], 0, ()
+
+    @staticmethod
+    def _probe_move(entry, t):
+        if entry is None or entry[4] is None:
+            return None
+        return SYMMETRY_INVERSES[t][entry[4]]
+
+    def _quiesce(self, stone, alpha, beta, ply, qdepth):
+        self.nodes += 1
+        if self.nodes & 63 == 0 and time.perf_counter() > self.clock.hard:
+            raise SearchTimeout()
+
+        board = self.board
+        opponent_stone = other_stone(stone)
+        if board.wins[stone]:
+            return WIN_SCORE - ply
+        opponent_wins = board.wins[opponent_stone]
+        if len(opponent_wins) >= 2:
+            return -(WIN_SCORE - ply - 1)
+        if qdepth <= 0 or ply >= MAX_PLY:
+            return quick_position_score(board, stone)
+
+        if opponent_wins:
+            # No stand-pat against a five threat: the block is forced.
+            best = -WIN_SCORE - 1
+            moves = drop_forbidden(board, sorted(opponent_wins), stone)
+            if not moves:
+                return -(WIN_SCORE - ply - 1)
+        else:
+            open_fours = cached_open_fours(board, opponent_stone, self.open_fours)
+            if open_fours:
+                best = -WIN_SCORE - 1
+                moves = three_defences(board, opponent_stone, open_fours)
+            else:
+                best = quick_position_score(board, stone)
+                if best >= beta:
+                    return best
+                moves = sorted(board.fours[stone], key=lambda idx: (-own_shape_score(board, idx, stone), idx))
+            if not moves:
+                return best if best > -WIN_SCORE - 1 else -(WIN_SCORE - ply - 3)
+        if best > alpha:
+            alpha = best
+
+        for idx in moves:
+            board.make(idx, stone)
+            score = -self._quiesce(opponent_stone, -beta, -alpha, ply + 1, qdepth - 1)
+            board.unmake()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+class Ponderer:
+    """Searches the opponent's likely replies on a background thread.
+
+    start() takes the position after our move, predicts up to PONDER_REPLIES
+    replies with generate_moves and searches the position after each one in
+    turn, writing into the game's transposition table. take() reports the
+    pondered result for the position we actually got. stop() must return
+    before the main thread searches again: the table is not locked.
+    start() runs the ponder on its own thread; a caller with its own
+    threads calls reset() and then run() on one of them, and halt() to ask
+    it to finish early.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.ordering = MoveOrdering()
+        self.results = {}
+        self.thread = None
+        self.clock = None
+        self.stopping = False
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, board, stone):
+        self.stop()
+        self.reset()
+        self.thread = threading.Thread(target=self.run, args=(board.copy(), stone), daemon=True)
+        self.thread.start()
+
+    def reset(self):
+        self.results = {}
+        self.stopping = False
+
+    def halt(self):
+        """Ask a running ponder to return after its current search step."""
+        self.stopping = True
+        clock = self.clock
+        if clock is not None:
+            clock.cancel()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.halt()
+        self.thread.join()
+        self.thread = None
+        self.clock = None
+
+    def take(self, board):
+        """Return (best_idx, depth, elapsed_ms) pondered for this position, or None."""
+        result = self.results.pop(board.hash, None)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def run(self, board, stone):
+        """Ponder `board`, `stone` to move, on the calling thread; the board is used up."""
+        my_stone = other_stone(stone)
+        for reply in generate_moves(board, stone, PONDER_REPLIES)[:PONDER_REPLIES]:
+            if reply in board.wins[stone]:
+                continue
+            board.make(reply, stone)
+            search = NegamaxSearch(
+                board,
+                table=self.table,
+                ordering=self.ordering,
+                clock=TimeManager.fixed(PONDER_TIME_MS),
+            )
+            self.clock = search.clock
+            if self.stopping:
+                board.unmake()
+                return
+            roots = generate_moves(board, my_stone, ROOT_CANDIDATES)
+            best_idx, _ = search.search(my_stone, roots)
+            if best_idx is not None:
+                self.results[board.hash] = (best_idx, search.depth_reached, search.clock.elapsed_ms())
+            board.unmake()
+            if self.stopping:
+                return
+
+
+_worker_bound = None
+_worker_search = None
+_worker_search_id = None
+
+
+def _init_root_worker(bound):
+    global _worker_bound, _worker_search
+    _worker_bound = bound
+    _worker_search = NegamaxSearch(Board(), table=new_transposition_table())
+
+
+def board_from_history(history):
+    board = Board()
+    for idx, stone in history:
+        board.make(idx, stone)
+    return board
+
+
+def _root_lookahead_task(args):
+    history, idx, stone, depth, deadline_wall = args
+    if deadline_wall is not None and time.time() > deadline_wall:
+        return idx, None
+    board = board_from_history(history)
+    return idx, eval_candidate_with_lookahead(board, idx, stone, depth)
+
+
+def _root_negamax_task(args):
+    global _worker_search_id
+    history, idx, stone, depth, deadline_wall, width, search_id = args
+    time_ms = (deadline_wall - time.time()) * 1000.0
+    if time_ms <= 0:
+        return idx, None, 0
+    search = _worker_search
+    board = search.board
+    if search_id != _worker_search_id:
+        # First task of a new root search in this worker: age the table and
+        # ordering once, as a serial search does, and set up its position.
+        _worker_search_id = search_id
+        search.table.new_search()
+        search.ordering.new_search()
+        search.open_fours = {}
+        board = board_from_history(history)
+    # score_root_move restores the board, so later tasks of the same search reuse it.
+    search.rebind(board, TimeManager.fixed(time_ms))
+    search.width = width
+    try:
+        score = search.score_root_move(stone, idx, depth, _worker_bound.value)
+    except SearchTimeout:
+        return idx, None, search.nodes
+    # Publish the bound so root moves started later search a narrower window.
+    with _worker_bound.get_lock():
+        if score > _worker_bound.value:
+            _worker_bound.value = score
+    return idx, score, search.nodes
+
+
+class RootPool:
+    """Persistent worker processes that score root moves in parallel.
+
+    Workers are forked once, after the pattern tables are built, and each
+    keeps one negamax search whose transposition table and move ordering
+    are aged once per root search, not per root move. Results come back as
+    each root move finishes; a task started after the deadline returns at
+    once, so a call drains its own tasks before the next one starts. For
+    negamax every depth shares one alpha bound in shared memory: a worker
+    raises it when a move improves on it, and later moves start from the
+    raised bound.
+    """
+
+    def __init__(self, workers=PARALLEL_WORKERS):
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self.workers = workers
+        self.bound = ctx.Value("q", -WIN_SCORE - 1)
+        self.pool = ctx.Pool(workers, initializer=_init_root_worker, initargs=(self.bound,))
+        self.nodes = 0
+        self.depth_reached = 0
+        self.searches = 0
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def lookahead(self, board, moves, stone, depth, deadline=None):
+        """Parallel best_move_with_lookahead; ranks the same scores in the same order."""
+        history = [(idx, board.cells[idx]) for idx in board.history]
+        deadline_wall = None if deadline is None else time.time() + max(0.0, deadline - time.perf_counter())
+        # Like the serial search, the first candidate is scored whatever the clock says.
+        tasks = [(history, idx, stone, depth, deadline_wall if i else None) for i, idx in enumerate(moves)]
+        scores = {}
+        for idx, score in self.pool.imap_unordered(_root_lookahead_task, tasks):
+            if score is not None:
+                scores[idx] = score
+        return pick_ranked_index([(scores[idx], idx) for idx in moves if idx in scores])
+
+    def negamax(self, board, moves, stone, clock, max_depth=SEARCH_MAX_DEPTH, width=SEARCH_WIDTH):
+        """Iterative deepening with each depth's root moves spread over the pool."""
+        if not moves:
+            return None, 0
+        history = [(idx, board.cells[idx]) for idx in board.history]
+        deadline_wall = time.time() + max(0.0, clock.hard - time.perf_counter())
+        order = list(moves)
+        best_idx, best_score = order[0], 0
+        self.nodes = 0
+        self.depth_reached = 0
+        self.searches += 1
+        for depth in range(1, max_depth + 1):
+            with self.bound.get_lock():
+                self.bound.value = -WIN_SCORE - 1
+            tasks = [(history, idx, stone, depth, deadline_wall, width, self.searches) for idx in order]
+            results = {}
+            complete = True
+            for idx, score, nodes in self.pool.imap_unordered(_root_negamax_task, tasks):
+                self.nodes += nodes
+                if score is None:
+                    complete = False
+                else:
+                    results[idx] = score
+            if not complete:
+                # Same rule as the serial search: keep a move that beat the previous best.
+                first = results.get(order[0])
+                if first is not None:
+                    finished = [(results[idx], idx) for idx in order if idx in results]
+                    best_score, best_idx = max(finished, key=lambda item: item[0])
+                break
+            previous = best_idx
+            scored = sorted(((results[idx], idx) for idx in order), key=lambda item: -item[0])
+            order = [idx for _, idx in scored]
+            best_score, best_idx = scored[0]
+            self.depth_reached = depth
+            if abs(best_score) >= WIN_SCORE - MAX_PLY:
+                break
+            if clock.past(0.5 if depth > 1 and best_idx != previous else 0.0):
+                break
+        return best_idx, best_score
+
+
+ROOT_POOL = None
+
+
+def get_root_pool():
+    """Return the process-wide RootPool, forking it on first use.
+
+    Workers beyond the CPU count only add process overhead, so on a single
+    core the search stays serial whatever PARALLEL_WORKERS says.
+    """
+    global ROOT_POOL
+    workers = min(PARALLEL_WORKERS, os.cpu_count() or 1)
+    if ROOT_POOL is None and workers > 1:
+        ROOT_POOL = RootPool(workers)
+    return ROOT_POOL
+
+
+def ponder_position(game, move):
+    """Return (board, stone to move) after our `move` in `game`, or None if there is nothing to ponder."""
+    board = board_from_game(game)
+    stone = STONE_BY_COLOR.get(game.get("turn_color"))
+    if board is None or not stone:
+        return None
+    idx = cell_index(move["x"], move["y"])
+    if board.cells[idx] != EMPTY or idx in board.wins[stone]:
+        return None
+    board.make(idx, stone)
+    return board, other_stone(stone)
+
+
+def start_pondering(ponderer, game, move):
+    position = ponder_position(game, move)
+    if position is not None:
+        ponderer.start(*position)
+
+
+def negamax_best_move(board, moves, stone, table=None, ordering=None, clock=None):
+    best_idx, _ = NegamaxSearch(board, table=table, ordering=ordering, clock=clock).search(stone, moves)
+    if best_idx is None:
+        return None
+    return move_dict(best_idx)
+
+
+class MctsNode:
+    __slots__ = ("move", "stone", "key", "prior", "children", "visits", "value", "terminal")
+
+    def __init__(self, move, stone, key, prior):
+        self.move = move
+        self.stone = stone
+        self.key = key
+        self.prior = prior
+        self.children = None
+        self.visits = 0
+        self.value = 0.0
+        self.terminal = None
+
+
+def move_priors(moves):
+    # Shortlist rank is the prior: weight 1 / (rank + 1), normalised.
+    weights = [1.0 / (rank + 1) for rank in range(len(moves))]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+class MctsSearch:
+    """PUCT Monte Carlo tree search with batched leaf evaluation.
+
+    A node's value sums win rates for the player who made its move.
+    Children come from generate_moves (the shortlist, or only the forced
+    replies) with shortlist rank as the prior. A new leaf is scored by
+    quick_position_score mapped to a win probability instead of a random
+    playout, and is expanded at the same time. Each batch descends to
+    `batch` leaves under virtual loss and backs them all up at the end.
+
+    Keep one instance per game: search() re-roots the tree on the node for
+    the current position when it is at most two plies below the last root.
+    """
+
+    def __init__(self, batch=MCTS_BATCH, width=MCTS_WIDTH, exploration=MCTS_EXPLORATION):
+        self.batch = batch
+        self.width = width
+        self.exploration = exploration
+        self.root = None
+        self.playouts = 0
+        self.reused = 0
+
+    def search(self, board, stone, root_moves, clock):
+        """Run batches until the clock's soft limit and return the most visited root move."""
+        if not root_moves:
+            return None
+        root = self._reroot(board, stone)
+        if root is None:
+            root = self.root = MctsNode(None, other_stone(stone), board.hash, 1.0)
+        allowed = set(root_moves)
+        if root.children is not None:
+            root.children = [child for child in root.children if child.move in allowed]
+        if not root.children:
+            root.children = self._children(board, root_moves, stone)
+        self.playouts = 0
+        while True:
+            self._run_batch(board)
+            if clock.past() or any(child.terminal == 1.0 for child in root.children):
+                break
+        best = max(root.children, key=lambda child: (child.terminal == 1.0, child.visits, child.value))
+        return best.move
+
+    def _reroot(self, board, stone):
+        frontier = [self.root] if self.root is not None else []
+        for _ in range(3):
+            for node in frontier:
+                if node.key == board.hash and other_stone(node.stone) == stone:
+                    if node is not self.root:
+                        self.reused += 1
+                    self.root = node
+                    return node
+            frontier = [child for node in frontier for child in (node.children or ())]
+        return None
+
+    def _children(self, board, moves, stone):
+        keys = ZOBRIST_KEYS[stone]
+        return [
+            MctsNode(idx, stone, board.hash ^ keys[idx], prior)
+            for idx, prior in zip(moves, move_priors(moves))
+        ]
+
+    def _run_batch(self, board):
+        leaves = [self._descend(board) for _ in range(self.batch)]
+        for path, value in leaves:
+            leaf_stone = path[-1].stone
+            for node in path:
+                node.value += value if node.stone == leaf_stone else 1.0 - value
+        self.playouts += len(leaves)
+
+    def _descend(self, board):
+        node = self.root
+        node.visits += 1
+        path = [node]
+        base_len = len(board.history)
+        while node.children:
+            node = self._select(node)
+            board.make(node.move, node.stone)
+            node.visits += 1
+            path.append(node)
+        if node.terminal is not None:
+            value = node.terminal
+        else:
+            value = self._evaluate(board, node)
+        while len(board.history) > base_len:
+            board.unmake()
+        return path, value
+
+    def _select(self, node):
+        scale = self.exploration * math.sqrt(node.visits)
+        best = None
+        best_score = -1.0
+        for child in node.children:
+            if child.terminal == 1.0:
+                return child
+            # Visits already include virtual losses from this batch.
+            q = child.value / child.visits if child.visits else 0.5
+            score = q + scale * child.prior / (1 + child.visits)
+            if score > best_score:
+                best = child
+                best_score = score
+        return best
+
+    def _evaluate(self, board, node):
+        mover = node.stone
+        to_move = other_stone(mover)
+        if board.wins[to_move]:
+            node.terminal = 0.0
+            return 0.0
+        if len(board.wins[mover]) >= 2:
+            node.terminal = 1.0
+            return 1.0
+        moves = generate_moves(board, to_move, self.width)
+        if not moves:
+            node.terminal = 0.5
+            return 0.5
+        node.children = self._children(board, moves, to_move)
+        x = max(-60.0, min(60.0, quick_position_score(board, mover) / MCTS_VALUE_SCALE))
+        return 1.0 / (1.0 + math.exp(-x))
+
+
+def find_forcing_threats(board, stone, probe_moves, max_found=40, share=None):
     threats = set()
-    for move in probe_moves:
-        x = move["x"]
-        y = move["y"]
-        if board[y][x] is not None:
+    cells = board.cells
+    wins = board.wins[stone]
+    fours = board.fours[stone]
+    memo = share.threats if share is not None else None
+    for idx in drop_forbidden(board, probe_moves, stone):
+        if cells[idx] != EMPTY:
             continue
 
-        board[y][x] = color
-        if is_win_after_placing(board, x, y, color):
-            threats.add((x, y))
-        else:
+        if idx in wins:
+            threats.add(idx)
+        elif idx in fours or len(wins) >= 2:
             # Fork threats: opponent creates two immediate wins next turn.
-            wins_next = find_immediate_wins(board, color, limit=3)
-            if len(wins_next) >= 2:
-                threats.add((x, y))
-        board[y][x] = None
+            # Only a four-making stone can add a win square, so anything else
+            # is skipped unless two wins already exist (placing may spoil one).
+            forks = memo.get((stone, idx)) if memo is not None else None
+            if forks is None:
+                board.make(idx, stone)
+                forks = count_immediate_wins(board, stone, limit=2) >= 2
+                board.unmake()
+                if memo is not None:
+                    memo[(stone, idx)] = forks
+            if forks:
+                threats.add(idx)
 
         if len(threats) >= max_found:
             break
@@ -626,48 +2535,500 @@ def find_forcing_threats(board, color, probe_moves, max_found=40):
     return threats
 
 
-def evaluate_opening_position(board, my_color, next_turn_color):
-    opponent_color = opposite(my_color)
-    score = quick_position_score(board, my_color)
+class VcfSolver:
+    """Victory by continuous fours for the side on move.
+
+    Every attacker move must make a four and every defender move is the
+    single forced block, so the tree stays narrow enough for long lines.
+    `max_nodes` bounds attacker moves tried per solve and `max_depth` the
+    attacker moves in a line. Results are cached by Zobrist key; failures
+    are only cached when the node budget was not hit.
+    """
+
+    def __init__(self, max_nodes=VCF_MAX_NODES, max_depth=VCF_MAX_DEPTH):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.cache = {}
+        self.nodes = 0
+        self.hits = 0
+        self.exhausted = False
+        self.deadline = None
+        self.budget = max_nodes
+
+    def solve(self, board, attacker, deadline=None, max_nodes=None):
+        """Return the winning line (attacker and defender moves alternating) or None.
+
+        The line ends with the attacker's five, or with the one square the
+        defender would have to take after a double four or after a four whose
+        only block is forbidden for black; that square does not stop the five.
+        `deadline` is an optional perf_counter() time after which the search
+        gives up as if the node budget were spent; `max_nodes` lowers the
+        node budget for this call.
+        """
+        self.nodes = 0
+        self.exhausted = False
+        self.deadline = deadline
+        self.budget = self.max_nodes if max_nodes is None else min(max_nodes, self.max_nodes)
+        line = self._attack(board, attacker, self.max_depth)
+        self.exhausted = line is None and self.exhausted
+        return line
+
+    def _spent(self):
+        if self.nodes >= self.budget or (self.deadline is not None and time.perf_counter() > self.deadline):
+            self.exhausted = True
+        return self.exhausted
+
+    def _attack(self, board, attacker, depth):
+        wins = board.wins[attacker]
+        if wins:
+            return [min(wins)]
+        if depth <= 0:
+            return None
+
+        key = board.hash ^ ZOBRIST_SIDE[attacker]
+        cached = self.cache.get(key)
+        if cached is not None and (cached[0] is not None or cached[1] >= depth):
+            self.hits += 1
+            return cached[0]
+
+        defender = other_stone(attacker)
+        threats = board.wins[defender]
+        if len(threats) >= 2:
+            return None
+        candidates = board.fours[attacker]
+        if threats:
+            # A four that does not also block loses to the defender's five.
+            candidates = candidates & threats
+        order = sorted(candidates, key=lambda idx: (-own_shape_score(board, idx, attacker), idx))
+
+        result = None
+        for idx in order:
+            if self._spent():
+                break
+            self.nodes += 1
+            board.make(idx, attacker)
+            replies = board.wins[attacker]
+            if len(replies) >= 2:
+                result = [idx, min(replies)]
+            elif replies:
+                block = next(iter(replies))
+                if defender == BLACK and block in board.forbidden:
+                    # The only block is illegal for black, so the five follows.
+                    result = [idx, block]
+                else:
+                    board.make(block, defender)
+                    line = self._attack(board, attacker, depth - 1)
+                    board.unmake()
+                    if line is not None:
+                        result = [idx, block] + line
+            board.unmake()
+            if result is not None:
+                break
+
+        if result is not None or not self.exhausted:
+            self.cache[key] = (result, depth)
+        return result
+
+
+def find_vcf_defenses(board, stone, legal_moves, solver, threat_line, deadline=None):
+    """Return legal moves after which the opponent no longer has a VCF.
+
+    Candidates are the cells of the opponent's winning line plus our own
+    four moves, which force a reply and may gain a tempo. They share one
+    solver node budget, so a wide candidate list does not multiply it.
+    """
+    opponent_stone = other_stone(stone)
+    legal_set = set(legal_moves)
+    candidates = sorted((set(threat_line) | board.fours[stone]) & legal_set)
+    share = max(100, solver.max_nodes // max(1, len(candidates)))
+    defenses = []
+    for idx in candidates:
+        board.make(idx, stone)
+        line = solver.solve(board, opponent_stone, deadline, max_nodes=share)
+        refuted = line is None and not solver.exhausted
+        board.unmake()
+        if refuted:
+            defenses.append(idx)
+    return defenses
+
+
+class VctSolver:
+    """Victory by continuous threats: fours and threes, depth-first.
+
+    An attacker move must make a four or a three (a threat to make an open
+    four next). Against a four the defender's only reply is the block;
+    against a three it may play any cell that removes every open-four
+    square, or one of its own fours. A three is also not forcing when the
+    defender has a VCF of its own. `max_depth` counts attacker moves.
+
+    The solver is meant to live for a whole game: proven wins and losses are
+    cached by Zobrist key, so once a line is proven the following turns
+    replay it from the cache. A search that runs out of nodes or time is
+    abandoned without caching the unfinished nodes.
+    """
+
+    def __init__(self, max_nodes=VCT_MAX_NODES, max_depth=VCT_MAX_DEPTH, time_ms=VCT_TIME_MS):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.time_ms = time_ms
+        self.attack_cache = {}
+        self.defence_cache = {}
+        self.vcf = VcfSolver(max_nodes=max(100, max_nodes // 20))
+        self.nodes = 0
+        self.hits = 0
+        self.exhausted = False
+        self.deadline = 0.0
+
+    def solve(self, board, attacker, time_ms=None):
+        """Return the attacker's first winning move, or None if not proven."""
+        self.nodes = 0
+        self.exhausted = False
+        budget = self.time_ms if time_ms is None else min(self.time_ms, time_ms)
+        self.deadline = time.perf_counter() + budget / 1000.0
+        base_len = len(board.history)
+        try:
+            return self._attack(board, attacker, self.max_depth)
+        except SearchTimeout:
+            while len(board.history) > base_len:
+                board.unmake()
+            self.exhausted = True
+            return None
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes >= self.max_nodes or time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _attack(self, board, attacker, depth):
+        self._tick()
+        wins = board.wins[attacker]
+        if wins:
+            return min(wins)
+        defender = other_stone(attacker)
+        threats = board.wins[defender]
+        if len(threats) >= 2 or depth <= 0:
+            return None
+
+        key = board.hash ^ ZOBRIST_SIDE[attacker]
+        cached = self.attack_cache.get(key)
+        if cached is not None and (cached[0] is not None or cached[1] >= depth):
+            self.hits += 1
+            return cached[0]
+
+        if threats:
+            candidates = drop_forbidden(board, list(threats), attacker)
+        else:
+            candidates = self._threat_moves(board, attacker)
+
+        result = None
+        for idx in candidates:
+            board.make(idx, attacker)
+            proven = self._defend(board, attacker, depth - 1)
+            board.unmake()
+            if proven:
+                result = idx
+                break
+        self.attack_cache[key] = (result, depth)
+        return result
+
+    def _threat_moves(self, board, attacker):
+        fours = sorted(board.fours[attacker], key=lambda idx: (-own_shape_score(board, idx, attacker), idx))
+        four_set = set(fours)
+        p0, p1, p2, p3 = board.patterns[attacker]
+        threes = [
+            idx
+            for idx in drop_forbidden(board, collect_frontier_moves(board, radius=2), attacker)
+            if idx not in four_set
+            and (THREE_CODES[p0[idx]] or THREE_CODES[p1[idx]] or THREE_CODES[p2[idx]] or THREE_CODES[p3[idx]])
+        ]
+        threes.sort(key=lambda idx: (-own_shape_score(board, idx, attacker), idx))
+        return fours + threes
+
+    def _defend(self, board, attacker, depth):
+        self._tick()
+        defender = other_stone(attacker)
+        if board.wins[defender]:
+            return False
+        wins = board.wins[attacker]
+        if len(wins) >= 2:
+            return True
+
+        key = board.hash ^ ZOBRIST_SIDE[defender]
+        cached = self.defence_cache.get(key)
+        if cached is not None and (cached[0] or cached[1] >= depth):
+            self.hits += 1
+            return cached[0]
+
+        if wins:
+            # No legal block for black leaves `replies` empty: proven.
+            replies = drop_forbidden(board, list(wins), defender)
+        else:
+            open_fours = open_four_squares(board, attacker)
+            if not open_fours or self._has_counter_vcf(board, defender):
+                self.defence_cache[key] = (False, depth)
+                return False
+            replies = three_defences(board, attacker, open_fours)
+
+        proven = True
+        for idx in replies:
+            board.make(idx, defender)
+            line = self._attack(board, attacker, depth)
+            board.unmake()
+            if line is None:
+                proven = False
+                break
+        self.defence_cache[key] = (proven, depth)
+        return proven
+
+    def _has_counter_vcf(self, board, defender):
+        line = self.vcf.solve(board, defender)
+        # An unfinished VCF search is treated as a refutation to keep proofs sound.
+        return line is not None or self.vcf.exhausted
+
+
+BOOK_MOVE = 0
+BOOK_SWAP = 1
+BOOK_OFFER10 = 2
+BOOK_SELECT = 3
+# The book covers moves 1-5, so positions with fewer stones than this.
+BOOK_MAX_STONES = 5
+BOOK_PROB_SCALE = 1_000_000
+BOOK_NO_CELL = 255
+
+
+def _build_book_salts():
+    rng = random.Random(0xB00C)
+    return tuple((0, rng.getrandbits(64), rng.getrandbits(64)) for _ in range(4))
+
+
+# Mixed into the canonical key so every decision kind and side has its own record.
+BOOK_SALTS = _build_book_salts()
+
+
+class OpeningBook:
+    """Opening decisions in a read-only mmap of sorted fixed-size records.
+
+    The file is a header (magic, record count) and then records of a uint64
+    key, 10 cell bytes and 10 int32 scores, sorted by key. The key is
+    canonical_hash(board) ^ BOOK_SALTS[kind][stone] and cells are y * 15 + x
+    in the canonical orientation (BOOK_NO_CELL when unused), so one record
+    serves all eight symmetric positions. Per kind, for `stone` deciding:
+
+      BOOK_MOVE     up to 10 ranked moves and their scores
+      BOOK_SWAP     scores[0:2] = keep and swap scores
+      BOOK_OFFER10  the offer candidates; scores[0:2] = best normal and
+                    offer win probabilities times BOOK_PROB_SCALE
+      BOOK_SELECT   scores[0] = the offer10 selection score of the position
+
+    A lookup is one canonical_hash and a binary search over the map.
+    """
+
+    MAGIC = b"RJBOOK01"
+    HEADER = struct.Struct("<8sI")
+    RECORD = struct.Struct("<Q10s10i")
+    KEY = struct.Struct("<Q")
+
+    def __init__(self, path=OPENING_BOOK_PATH):
+        with open(path, "rb") as handle:
+            self.map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC or self.HEADER.size + self.count * self.RECORD.size > len(self.map):
+            raise ValueError(f"not an opening book: {path}")
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, key):
+        """Return the raw record for `key` as (key, cells, *scores), or None."""
+        size = self.RECORD.size
+        base = self.HEADER.size
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = self.KEY.unpack_from(self.map, base + mid * size)[0]
+            if found == key:
+                return self.RECORD.unpack_from(self.map, base + mid * size)
+            if found < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def lookup(self, board, kind, stone):
+        """Return (moves, scores) for the position, moves mapped back onto `board`, or None."""
+        key, t = canonical_hash(board)
+        record = self.find(key ^ BOOK_SALTS[kind][stone])
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        inverse = SYMMETRY_INVERSES[t]
+        moves = [
+            inverse[cell_index(cell % BOARD_SIZE, cell // BOARD_SIZE)] for cell in record[1] if cell != BOOK_NO_CELL
+        ]
+        return moves, record[2:]
+
+    @staticmethod
+    def entry(board, kind, stone, moves=(), scores=()):
+        """Return a (key, cells, scores) record for write(), moves given on `board`."""
+        key, t = canonical_hash(board)
+        mapping = SYMMETRY_MAPS[t]
+        cells = []
+        for idx in moves[:10]:
+            x, y = cell_coords(mapping[idx])
+            cells.append(y * BOARD_SIZE + x)
+        cells += [BOOK_NO_CELL] * (10 - len(cells))
+        scores = [int(score) for score in scores[:10]]
+        scores += [0] * (10 - len(scores))
+        return key ^ BOOK_SALTS[kind][stone], bytes(cells), tuple(scores)
+
+    @classmethod
+    def write(cls, path, entries):
+        """Write entry() records to `path`, replacing any previous book atomically."""
+        records = {key: (cells, scores) for key, cells, scores in entries}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as handle:
+            handle.write(cls.HEADER.pack(cls.MAGIC, len(records)))
+            for key in sorted(records):
+                cells, scores = records[key]
+                handle.write(cls.RECORD.pack(key, cells, *scores))
+        os.replace(tmp, path)
+        return len(records)
+
+    def stats(self):
+        return {"records": self.count, "hits": self.hits, "misses": self.misses}
+
+
+OPENING_BOOK = None
+OPENING_BOOK_TRIED = False
+
+
+def get_opening_book():
+    """Return the process-wide OpeningBook, mapped on first use, or None without one."""
+    global OPENING_BOOK, OPENING_BOOK_TRIED
+    if not OPENING_BOOK_TRIED:
+        OPENING_BOOK_TRIED = True
+        if OPENING_BOOK_PATH and os.path.exists(OPENING_BOOK_PATH):
+            try:
+                OPENING_BOOK = OpeningBook(OPENING_BOOK_PATH)
+            except (OSError, ValueError) as e:
+                print(f"opening book unavailable: {e}")
+    return OPENING_BOOK
+
+
+def book_lookup(board, kind, stone):
+    book = get_opening_book()
+    if book is None:
+        return None
+    return book.lookup(board, kind, stone)
+
 
-    my_wins = len(find_immediate_wins(board, my_color, limit=4))
-    opp_wins = len(find_immediate_wins(board, opponent_color, limit=4))
+def evaluate_opening_position(board, my_stone, next_turn_stone, share=None):
+    opponent_stone = other_stone(my_stone)
+    score = quick_position_score(board, my_stone, share=share)
+
+    my_wins = count_immediate_wins(board, my_stone, limit=4)
+    opp_wins = count_immediate_wins(board, opponent_stone, limit=4)
     score += my_wins * 8000 - opp_wins * 9000
 
-    if next_turn_color == my_color:
+    if next_turn_stone == my_stone:
         score += my_wins * 5000
         score -= opp_wins * 1500
-    elif next_turn_color == opponent_color:
+    elif next_turn_stone == opponent_stone:
         score -= opp_wins * 12000
         score += my_wins * 1200
 
     probe = shortlist_moves(
         board,
-        collect_frontier_moves(board, radius=2),
-        opponent_color,
+        share.frontier if share is not None else collect_frontier_moves(board, radius=2),
+        opponent_stone,
         limit=40,
     )
-    opp_forcing = len(find_forcing_threats(board, opponent_color, probe, max_found=20))
-    my_forcing = len(find_forcing_threats(board, my_color, probe, max_found=20))
+    opp_forcing = len(find_forcing_threats(board, opponent_stone, probe, max_found=20, share=share))
+    my_forcing = len(find_forcing_threats(board, my_stone, probe, max_found=20, share=share))
     score += my_forcing * 1000 - opp_forcing * 1600
 
     return score
 
 
+def evaluate_opening_batch(board, variants):
+    """Score one-stone variants of `board` in place, without copying it.
+
+    `variants` holds (idx, stone, perspective_stone, next_turn_stone) tuples
+    and the result is the evaluate_opening_position score of each, in order.
+    The base frontier is computed once and patched per variant; variants
+    placing the same stone share one make/unmake and their forcing-threat
+    checks.
+    """
+    cells = board.cells
+    base_frontier = set(collect_frontier_moves(board, radius=2)) if board.history else set()
+
+    groups = {}
+    for i, (idx, stone, _, _) in enumerate(variants):
+        groups.setdefault((idx, stone), []).append(i)
+
+    results = [0] * len(variants)
+    for (idx, stone), members in groups.items():
+        frontier = set(base_frontier)
+        frontier.update(n for n in NEIGHBORHOODS[2][idx] if cells[n] == EMPTY)
+        frontier.discard(idx)
+        share = EvalShare(sorted(frontier))
+
+        board.make(idx, stone)
+        for i in members:
+            _, _, perspective_stone, next_turn_stone = variants[i]
+            results[i] = evaluate_opening_position(board, perspective_stone, next_turn_stone, share=share)
+        board.unmake()
+    return results
+
+
+def board_from_game(game):
+    rows = game.get("board")
+    if not isinstance(rows, list) or len(rows) != BOARD_SIZE:
+        return None
+    return Board.from_rows(rows)
+
+
+def legal_indices(board, moves):
+    indices = []
+    for m in moves:
+        x = m.get("x")
+        y = m.get("y")
+        if not isinstance(x, int) or not isinstance(y, int):
+            continue
+        if not in_bounds(x, y):
+            continue
+        idx = cell_index(x, y)
+        if board.cells[idx] != EMPTY:
+            continue
+        indices.append(idx)
+    return indices
+
+
+def opening_swap_scores(board, my_stone, keep_turn, swap_turn):
+    """Return (keep, swap): the position scored for keeping `my_stone` or swapping."""
+    hit = book_lookup(board, BOOK_SWAP, my_stone)
+    if hit is not None:
+        return hit[1][0], hit[1][1]
+    keep_score = evaluate_opening_position(board, my_stone, keep_turn)
+    swap_score = evaluate_opening_position(board, other_stone(my_stone), swap_turn)
+    return keep_score, swap_score
+
+
 def decide_swap(game, agent_id):
-    board = game.get("board")
-    if not isinstance(board, list) or len(board) != BOARD_SIZE:
+    board = board_from_game(game)
+    if board is None:
         return False, {"keep": 0, "swap": 0, "diff": 0}
 
     my_color = get_color_for_agent(game, agent_id)
     if my_color not in ("black", "white"):
         return False, {"keep": 0, "swap": 0, "diff": 0}
+    my_stone = STONE_BY_COLOR[my_color]
 
-    keep_turn = projected_turn_color_after_swap(game, do_swap=False)
-    swap_turn = projected_turn_color_after_swap(game, do_swap=True)
+    keep_turn = STONE_BY_COLOR[projected_turn_color_after_swap(game, do_swap=False)]
+    swap_turn = STONE_BY_COLOR[projected_turn_color_after_swap(game, do_swap=True)]
 
-    keep_score = evaluate_opening_position(board, my_color, keep_turn)
-    swap_score = evaluate_opening_position(board, opposite(my_color), swap_turn)
+    keep_score, swap_score = opening_swap_scores(board, my_stone, keep_turn, swap_turn)
     diff = swap_score - keep_score
 
     if DETERMINISTIC_MODE:
@@ -683,54 +3044,45 @@ def decide_swap(game, agent_id):
     return diff > SWAP_MARGIN, {"keep": keep_score, "swap": swap_score, "diff": diff}
 
 
-def decide_offer10_proposal(game, agent_id):
-    if not OFFER10_ENABLED:
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
-
-    opening_state = game.get("opening_state") or {}
-    if not opening_state.get("awaiting_offer10"):
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
-
-    tentative_black = opening_state.get("tentative_black_agent_id")
-    if not tentative_black or tentative_black != agent_id:
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
-
-    board = game.get("board")
-    legal = game.get("legal_moves") or []
-    if not isinstance(board, list) or len(board) != BOARD_SIZE or not legal:
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
-
-    my_color = get_color_for_agent(game, agent_id)
-    if my_color not in ("black", "white"):
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
-
-    # The server transitions to midgame with "white" to move after offer10 selection.
-    # This only stays consistent if the selected move 5 is black, which implies the
-    # tentative black agent is currently black when proposing offer10.
-    if my_color != "black":
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0, "note": "not_current_black"}
+def offer10_scores(board, moves):
+    """Return (normal, offer, candidates) for black choosing between move 5 and offer10.
+
+    `normal` is the best win probability of a normal move 5 and `offer` the
+    worst of up to 10 candidate moves from distinct symmetry classes, given
+    as move dicts best first. Returns None without moves.
+    """
+    hit = book_lookup(board, BOOK_OFFER10, BLACK)
+    if hit is not None and set(hit[0]) <= set(moves):
+        book_moves, book_scores = hit
+        return (
+            book_scores[0] / BOOK_PROB_SCALE,
+            book_scores[1] / BOOK_PROB_SCALE,
+            [move_dict(idx) for idx in book_moves],
+        )
 
-    next_turn_color = "white"
+    my_stone = BLACK
+    next_turn_stone = WHITE
+
+    # Moves a board symmetry maps onto each other score the same, so only
+    # one of each set is evaluated.
+    symmetries = board_symmetries(board)
+    scored_moves = unique_moves(board, moves, symmetries)
+    variants = []
+    for idx in scored_moves:
+        variants.append((idx, my_stone, my_stone, next_turn_stone))
+        variants.append((idx, my_stone, other_stone(my_stone), next_turn_stone))
+    scores = evaluate_opening_batch(board, variants)
+    by_move = {}
+    for i, idx in enumerate(scored_moves):
+        for t in [0] + symmetries:
+            by_move[SYMMETRY_MAPS[t][idx]] = (scores[2 * i], scores[2 * i + 1])
 
     normal_scored = []
     offer_scored = []
-    for m in legal:
-        x = m.get("x")
-        y = m.get("y")
-        if not isinstance(x, int) or not isinstance(y, int):
-            continue
-        if not in_bounds(x, y):
-            continue
-        if board[y][x] is not None:
-            continue
-
-        simulated = [row[:] for row in board]
-        simulated[y][x] = my_color
-
-        keep_score = evaluate_opening_position(simulated, my_color, next_turn_color)
+    for idx in moves:
+        m = move_dict(idx)
+        keep_score, swap_score = by_move[idx]
         keep_p = score_to_win_prob(keep_score)
-
-        swap_score = evaluate_opening_position(simulated, opposite(my_color), next_turn_color)
         swap_p = score_to_win_prob(swap_score)
 
         # After a normal move 5, the opponent gets a final swap decision.
@@ -739,7 +3091,7 @@ def decide_offer10_proposal(game, agent_id):
         offer_scored.append((keep_p, m))
 
     if not normal_scored:
-        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+        return None
 
     normal_scored.sort(key=lambda it: (-it[0], stable_move_key(it[1])))
     best_normal_val = float(normal_scored[0][0])
@@ -757,15 +3109,49 @@ def decide_offer10_proposal(game, agent_id):
     unique = list(best_by_sym.values())
     unique.sort(key=lambda it: (-it[0], stable_move_key(it[1])))
     chosen = unique[:10]
-    if len(chosen) < 10:
+    offer_floor = float(min(p for p, _ in chosen))
+    return best_normal_val, offer_floor, [{"x": int(m["x"]), "y": int(m["y"])} for _, m in chosen]
+
+
+def decide_offer10_proposal(game, agent_id):
+    if not OFFER10_ENABLED:
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    opening_state = game.get("opening_state") or {}
+    if not opening_state.get("awaiting_offer10"):
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    tentative_black = opening_state.get("tentative_black_agent_id")
+    if not tentative_black or tentative_black != agent_id:
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    board = board_from_game(game)
+    legal = game.get("legal_moves") or []
+    if board is None or not legal:
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    my_color = get_color_for_agent(game, agent_id)
+    if my_color not in ("black", "white"):
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    # The server transitions to midgame with "white" to move after offer10 selection.
+    # This only stays consistent if the selected move 5 is black, which implies the
+    # tentative black agent is currently black when proposing offer10.
+    if my_color != "black":
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0, "note": "not_current_black"}
+
+    scored = offer10_scores(board, legal_indices(board, legal))
+    if scored is None:
+        return False, [], {"normal": 0.0, "offer": 0.0, "diff": 0.0}
+
+    best_normal_val, offer_floor, candidates = scored
+    if len(candidates) < 10:
         return False, [], {"normal": best_normal_val, "offer": 0.0, "diff": -1.0, "note": "insufficient_symmetry"}
 
-    offer_floor = float(min(p for p, _ in chosen))
     diff = offer_floor - best_normal_val
     min_improvement = max(0.0, float(OFFER10_MIN_IMPROVEMENT))
     do_offer = offer_floor >= best_normal_val + min_improvement
 
-    candidates = [{"x": int(m["x"]), "y": int(m["y"])} for _, m in chosen]
     detail = {
         "normal": round(best_normal_val, 4),
         "offer": round(offer_floor, 4),
@@ -775,13 +3161,33 @@ def decide_offer10_proposal(game, agent_id):
     return do_offer, candidates, detail
 
 
+def offer10_selection_score(board, my_stone):
+    """Score the board after an offered move 5 for `my_stone`, the selecting side."""
+    hit = book_lookup(board, BOOK_SELECT, my_stone)
+    if hit is not None:
+        return hit[1][0]
+
+    opponent_stone = other_stone(my_stone)
+    next_turn_stone = WHITE
+    score = evaluate_opening_position(board, my_stone, next_turn_stone)
+    my_wins = count_immediate_wins(board, my_stone, limit=4)
+    opp_wins = count_immediate_wins(board, opponent_stone, limit=4)
+    score += my_wins * 7000 - opp_wins * 11000
+
+    if next_turn_stone == opponent_stone and opp_wins > 0:
+        score -= 32000 + opp_wins * 7000
+    if next_turn_stone == my_stone and my_wins > 0:
+        score += 28000 + my_wins * 6000
+    return score
+
+
 def choose_offer10_candidate(game, agent_id):
     candidates = game.get("offer10_candidates") or []
     if not candidates:
         return None
 
-    board = game.get("board")
-    if not isinstance(board, list) or len(board) != BOARD_SIZE:
+    board = board_from_game(game)
+    if board is None:
         return pick_stable_move(candidates)
 
     opening_state = game.get("opening_state") or {}
@@ -793,247 +3199,746 @@ def choose_offer10_candidate(game, agent_id):
     my_color = get_color_for_agent(game, agent_id)
     if my_color not in ("black", "white"):
         return pick_stable_move(candidates)
-    opponent_color = opposite(my_color)
-    next_turn_color = "white"
+    my_stone = STONE_BY_COLOR[my_color]
+    move_stone = STONE_BY_COLOR[move_color]
 
+    # Candidates a board symmetry maps onto each other score the same.
+    symmetries = board_symmetries(board)
+    by_move = {}
     scored = []
     for candidate in candidates:
         x = candidate["x"]
         y = candidate["y"]
         if not in_bounds(x, y):
             continue
-        if board[y][x] is not None:
+        idx = cell_index(x, y)
+        if board.cells[idx] != EMPTY:
             continue
 
-        simulated = [row[:] for row in board]
-        simulated[y][x] = move_color
-
-        score = evaluate_opening_position(simulated, my_color, next_turn_color)
-        my_wins = len(find_immediate_wins(simulated, my_color, limit=4))
-        opp_wins = len(find_immediate_wins(simulated, opponent_color, limit=4))
-        score += my_wins * 7000 - opp_wins * 11000
-
-        if next_turn_color == opponent_color and opp_wins > 0:
-            score -= 32000 + opp_wins * 7000
-        if next_turn_color == my_color and my_wins > 0:
-            score += 28000 + my_wins * 6000
-
+        score = by_move.get(idx)
+        if score is None:
+            board.make(idx, move_stone)
+            score = offer10_selection_score(board, my_stone)
+            board.unmake()
+            for t in [0] + symmetries:
+                by_move[SYMMETRY_MAPS[t][idx]] = score
         scored.append((score, candidate))
 
     return pick_ranked_move(scored) or pick_stable_move(candidates)
 
 
-def choose_move(game):
+def choose_move(game, table=None, vct=None, ordering=None, clock=None, ponder=None, mcts=None):
     legal = game.get("legal_moves") or []
     if not legal:
         return None
 
-    board = game.get("board")
+    board = board_from_game(game)
     color = game.get("turn_color")
-    if (
-        color not in ("black", "white")
-        or not isinstance(board, list)
-        or len(board) != BOARD_SIZE
-    ):
+    if color not in ("black", "white") or board is None:
+        return pick_stable_move(legal)
+
+    stone = STONE_BY_COLOR[color]
+    opponent_stone = other_stone(stone)
+    legal_moves = drop_forbidden(board, legal_indices(board, legal), stone)
+    if not legal_moves:
         return pick_stable_move(legal)
 
-    opponent_color = opposite(color)
+    # 0) Opening book for moves 1-5.
+    if len(board.history) < BOOK_MAX_STONES:
+        hit = book_lookup(board, BOOK_MOVE, stone)
+        if hit is not None:
+            legal_set = set(legal_moves)
+            booked = [(score, idx) for idx, score in zip(*hit) if idx in legal_set]
+            if booked:
+                return pick_ranked_index(booked)
 
     # 1) Win immediately when possible.
-    immediate_wins = [m for m in legal if is_winning_move(board, m["x"], m["y"], color)]
+    immediate_wins = [idx for idx in legal_moves if idx in board.wins[stone]]
     if immediate_wins:
-        return best_scored_move(board, immediate_wins, color)
+        return best_scored_move(board, immediate_wins, stone)
 
     # 2) Block opponent's immediate wins if they exist.
-    opponent_wins_now = set(find_immediate_wins(board, opponent_color, limit=40))
+    opponent_wins_now = set(find_immediate_wins(board, opponent_stone, limit=40))
     if opponent_wins_now:
-        blockers = [m for m in legal if (m["x"], m["y"]) in opponent_wins_now]
+        blockers = [idx for idx in legal_moves if idx in opponent_wins_now]
         if blockers:
-            return best_scored_move(board, blockers, color)
-
-    # 3) Block opponent forcing forks (two immediate wins next).
+            return best_scored_move(board, blockers, stone)
+
+    if clock is None:
+        clock = TimeManager.from_game(game)
+
+    # 3) Win by continuous fours, or break the opponent's.
+    if VCF_ENABLED and not clock.past():
+        solver = VcfSolver()
+        line = solver.solve(board, stone, clock.soft)
+        if line and line[0] in legal_moves:
+            return move_dict(line[0])
+        threat_line = solver.solve(board, opponent_stone, clock.soft)
+        if threat_line:
+            defenses = find_vcf_defenses(board, stone, legal_moves, solver, threat_line, clock.soft)
+            if defenses:
+                return best_scored_move(board, defenses, stone)
+
+    # 4) Win by continuous threats (fours and threes); leave the search at
+    # least half of what remains.
+    if VCT_ENABLED and not clock.past():
+        solver = vct if vct is not None else VctSolver()
+        idx = solver.solve(board, stone, time_ms=clock.soft_left_ms() / 2.0)
+        if idx is not None and idx in legal_moves:
+            return move_dict(idx)
+
+    # 5) Block opponent forcing forks (two immediate wins next).
     probe = collect_frontier_moves(board, radius=2)
-    probe = shortlist_moves(board, probe, opponent_color, limit=90)
-    forcing = find_forcing_threats(board, opponent_color, probe, max_found=50)
+    probe = shortlist_moves(board, probe, opponent_stone, limit=90)
+    forcing = find_forcing_threats(board, opponent_stone, probe, max_found=50)
     if forcing:
-        blockers = [m for m in legal if (m["x"], m["y"]) in forcing]
+        blockers = [idx for idx in legal_moves if idx in forcing]
         if blockers:
-            return best_scored_move(board, blockers, color)
+            return best_scored_move(board, blockers, stone)
 
-    # 4) Look ahead and pick robust moves (attack + defense).
+    # 6) Look ahead and pick robust moves (attack + defense).
     move_number = int(game.get("move_number", 0))
-    pool = legal
+    pool = legal_moves
     if move_number <= EARLY_LOCALITY_UNTIL:
-        local_set = {(m["x"], m["y"]) for m in collect_frontier_moves(board, radius=2)}
-        local_pool = [m for m in legal if (m["x"], m["y"]) in local_set]
+        local_set = set(collect_frontier_moves(board, radius=2))
+        local_pool = [idx for idx in legal_moves if idx in local_set]
         if local_pool:
             pool = local_pool
+    # Symmetric root moves are equivalent; search one of each.
+    pool = unique_moves(board, pool)
 
     dynamic_root = ROOT_CANDIDATES
     if move_number <= EARLY_LOCALITY_UNTIL:
         dynamic_root += 4
 
-    candidates = shortlist_moves(board, pool, opponent_color, limit=dynamic_root)
-    best = best_move_with_lookahead(board, candidates, color, LOOKAHEAD_DEPTH)
-    if best:
-        return best
+    candidates = shortlist_moves(board, pool, opponent_stone, limit=dynamic_root)
+    if ponder is not None:
+        pondered = ponder.take(board)
+        if pondered is not None:
+            # The warmed table replays the pondered iterations almost for free.
+            clock.credit(pondered[2])
+    if not clock.expired():
+        pool = get_root_pool()
+        if SEARCH_ENGINE == "mcts":
+            tree = mcts if mcts is not None else MctsSearch()
+            best_idx = tree.search(board, stone, candidates, clock)
+            best = move_dict(best_idx) if best_idx is not None else None
+        elif pool is not None and SEARCH_ENGINE == "negamax":
+            best_idx, _ = pool.negamax(board, candidates, stone, clock)
+            best = move_dict(best_idx) if best_idx is not None else None
+        elif pool is not None:
+            best = pool.lookahead(board, candidates, stone, LOOKAHEAD_DEPTH, deadline=clock.hard)
+        elif SEARCH_ENGINE == "negamax":
+            best = negamax_best_move(board, candidates, stone, table=table, ordering=ordering, clock=clock)
+        else:
+            best = best_move_with_lookahead(board, candidates, stone, LOOKAHEAD_DEPTH, deadline=clock.hard)
+        if best:
+            return best
 
-    # 5) Fallback to one-ply tactical score.
-    best = best_scored_move(board, candidates, color)
+    # 7) Fallback to one-ply tactical score, also used when the budget is spent.
+    best = best_scored_move(board, candidates, stone)
     if best:
         return best
     return pick_stable_move(legal)
 
 
-def run_game_loop(token, game, agent_id):
-    game_id = game["id"]
-    color_hint = game.get("color")
-    since_move = -1
-    since_updated_at = ""
-    since_revision = ""
+class GameMirror:
+    """Local copy of a game, advanced from the partial games /wait returns.
+
+    /games/:id/wait carries only the games row (no moves, board, legal moves
+    or player ids) and a revision string. apply_wait() merges that row into
+    the last full GET /games/:id and rebuilds the revision the server would
+    compute from the merged fields and the row's own (normally absent)
+    player ids. A mismatch means the copy missed something, and a longer
+    swap history means the players were reassigned; either way the copy is
+    dropped.
+
+    The full game is only fetched when should_act() says the agent may have
+    something to do; wake-ups for the opponent's turn are answered from the
+    mirror alone. `in_sync` is False once the board may be out of date.
+    """
+
+    WAIT_FIELDS = ("status", "phase", "move_number", "turn_color", "turn_deadline_at", "updated_at")
+    OPENING_FIELDS = (
+        "tentative_black_agent_id",
+        "tentative_white_agent_id",
+        "awaiting_swap",
+        "swap_after_move",
+        "swap_history",
+        "awaiting_offer10_selection",
+        "offer10_id",
+    )
 
-    while True:
-        wait_status, waited = wait_game(game_id, since_move, since_updated_at, since_revision)
-        if wait_status == 404:
-            print(f"[game:{game_id}] no longer exists; leaving game loop")
-            return
-        if wait_status in (401, 403):
-            print(f"[game:{game_id}] wait unauthorized ({wait_status}); leaving game loop")
-            return
-        if wait_status != 200 or not waited:
-            time.sleep(1)
-            continue
+    def __init__(self):
+        self.game = None
+        self.in_sync = False
+        self.fetches = 0
+        self.skipped = 0
+
+    @staticmethod
+    def revision(game, players=None):
+        # Same fields and order as the server's waitRevisionForGame. The wait
+        # handler does not select the player ids, so the server sees them
+        # blank; `players` is the wait row, which only carries them when an
+        # automation (timeout, auto swap) replaced it with a full row.
+        opening_state = game.get("opening_state") or {}
+        players = players or {}
+
+        def text(value):
+            return "" if value is None else str(value)
+
+        return "|".join(
+            [
+                text(game.get("status")),
+                text(game.get("phase")),
+                text(game.get("move_number")),
+                text(game.get("turn_color")),
+                text(game.get("turn_deadline_at")),
+                text(game.get("updated_at")),
+                text(players.get("black_agent_id")),
+                text(players.get("white_agent_id")),
+                "1" if opening_state.get("awaiting_swap") else "0",
+                text(opening_state.get("swap_after_move")),
+                "1" if opening_state.get("awaiting_offer10_selection") else "0",
+                text(opening_state.get("offer10_id")),
+                str(len(opening_state.get("swap_history") or [])),
+            ]
+        )
 
-        partial = waited.get("game") or {}
-        since_move = int(partial.get("move_number", since_move))
-        since_updated_at = str(partial.get("updated_at", since_updated_at))
-        since_revision = str(waited.get("revision", since_revision))
+    def refresh(self, game):
+        self.game = game
+        self.in_sync = True
+        self.fetches += 1
 
-        game_status, full = get_game(game_id)
-        if game_status == 404:
-            print(f"[game:{game_id}] state unavailable (404); leaving game loop")
-            return
-        if game_status in (401, 403):
-            print(f"[game:{game_id}] game fetch unauthorized ({game_status}); leaving game loop")
+    def invalidate(self):
+        self.in_sync = False
+
+    def apply_wait(self, partial, revision):
+        game = self.game
+        if game is None:
             return
-        if game_status != 200 or not full:
-            time.sleep(1)
-            continue
+        before = self.revision(game)
+        swapped = False
+        for field in self.WAIT_FIELDS:
+            if field in partial:
+                game[field] = partial[field]
+        waited_opening = partial.get("opening_state")
+        if isinstance(waited_opening, dict):
+            opening_state = dict(game.get("opening_state") or {})
+            swaps = len(opening_state.get("swap_history") or [])
+            for key in self.OPENING_FIELDS:
+                if key in waited_opening:
+                    opening_state[key] = waited_opening[key]
+            opening_state["awaiting_offer10"] = (
+                int(game.get("move_number", 0)) == 4
+                and not opening_state.get("awaiting_swap")
+                and not opening_state.get("awaiting_offer10_selection")
+            )
+            game["opening_state"] = opening_state
+            # A swap exchanges black_agent_id and white_agent_id, which the row lacks.
+            swapped = len(opening_state.get("swap_history") or []) > swaps
+        if self.revision(game) != before:
+            self.in_sync = False
+        if swapped or (revision and self.revision(game, partial) != revision):
+            self.game = None
+            self.in_sync = False
+
+    def should_act(self, agent_id):
+        """False only when the mirror shows another agent to act in a live game."""
+        if self.game is None or not agent_id or self.game.get("status") != "active":
+            return True
+        acting_id = get_acting_agent_id(self.game)
+        return not acting_id or acting_id == agent_id
+
+
+class PollScheduler:
+    """Decides when one agent talks to the API next, and counts what it sends.
+
+    - admit() is called before every request. It takes a token from a bucket
+      refilled at POLL_BUDGET_RPM per minute (burst POLL_BUDGET_BURST) and
+      returns how long to sleep first.
+    - fail(kind) returns the next backoff for a kind of failure: exponential
+      from the kind's base, capped at POLL_BACKOFF_MAX, with equal jitter so
+      agents that failed together do not retry together. ok(kind) resets it.
+    - refresh() asks for one full-game fetch in place of the next wait; asks
+      made before it is served are coalesced into that fetch.
+    - Requests are counted per endpoint for the current game and per move.
+
+    It never sleeps itself, so the blocking daemon and the asyncio host
+    share it. `clock` and `rng` stand in for time.monotonic and the jitter
+    source in tests.
+    """
+
+    BACKOFF_BASES = {"stale": 0.05, "queue": 0.2, "auth": 0.5, "error": 1.0, "idle": IDLE_SLEEP}
+
+    def __init__(
+        self, rpm=POLL_BUDGET_RPM, burst=POLL_BUDGET_BURST, backoff_max=POLL_BACKOFF_MAX, clock=time.monotonic, rng=None
+    ):
+        self.rate = rpm / 60.0
+        self.burst = burst
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.tokens = float(burst)
+        self.stamp = clock()
+        self.streaks = {}
+        # Jitter must not consume the move-choice RNG, which may be seeded.
+        self.jitter = rng if rng is not None else random.Random()
+        self.refresh_pending = False
+        self.requests = 0
+        self.throttled_s = 0.0
+        self.start_game(None)
+
+    def start_game(self, game_id):
+        self.game_id = game_id
+        self.move = -1
+        self.game_requests = {}
+        self.move_requests = {}
+        self.backoffs = 0
+        self.backoff_s = 0.0
+        self.coalesced = 0
+
+    def at_move(self, move_number):
+        self.move = move_number
+
+    def admit(self, endpoint):
+        """Count a request to `endpoint` and return the seconds to wait before sending it."""
+        self.requests += 1
+        if self.game_id is not None:
+            self.game_requests[endpoint] = self.game_requests.get(endpoint, 0) + 1
+            self.move_requests[self.move] = self.move_requests.get(self.move, 0) + 1
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.stamp) * self.rate) - 1.0
+        self.stamp = now
+        if self.tokens >= 0:
+            return 0.0
+        delay = -self.tokens / self.rate
+        self.throttled_s += delay
+        return delay
+
+    def fail(self, kind):
+        streak = self.streaks.get(kind, 0)
+        self.streaks[kind] = streak + 1
+        delay = min(self.backoff_max, self.BACKOFF_BASES[kind] * (2 ** min(streak, 30)))
+        delay *= 0.5 + 0.5 * self.jitter.random()
+        self.backoffs += 1
+        self.backoff_s += delay
+        return delay
+
+    def ok(self, kind):
+        self.streaks.pop(kind, None)
+
+    def refresh(self):
+        if self.refresh_pending:
+            self.coalesced += 1
+        self.refresh_pending = True
+
+    def take_refresh(self):
+        pending = self.refresh_pending
+        self.refresh_pending = False
+        return pending
+
+    def http(self, method, path, **kwargs):
+        """http_json behind the budget, for the blocking daemon."""
+        delay = self.admit(endpoint_label(method, path))
+        if delay > 0:
+            time.sleep(delay)
+        return http_json(method, path, **kwargs)
+
+    def stats(self):
+        per_move = list(self.move_requests.values())
+        return {
+            "requests": sum(per_move),
+            "endpoints": dict(self.game_requests),
+            "moves": len(per_move),
+            "per_move_avg": round(sum(per_move) / len(per_move), 2) if per_move else 0.0,
+            "per_move_max": max(per_move, default=0),
+            "backoffs": self.backoffs,
+            "backoff_s": round(self.backoff_s, 2),
+            "coalesced": self.coalesced,
+            "throttled_s": round(self.throttled_s, 2),
+        }
 
-        if not agent_id and color_hint in ("black", "white"):
-            if color_hint == "black":
-                inferred = full.get("black_agent_id")
-            else:
-                inferred = full.get("white_agent_id")
-            if inferred:
-                agent_id = inferred
-                print(f"[game:{game_id}] inferred agent_id={agent_id}")
 
-        if full.get("status") == "finished":
-            print(f"[game:{game_id}] finished winner={full.get('winner_color')} reason={full.get('result_reason')}")
-            return
+class GameSearchState:
+    """Search state kept for one game: consecutive turns share most of their tree."""
 
-        opening_state = full.get("opening_state") or {}
-        if opening_state.get("awaiting_swap"):
-            decider_id = get_swap_decider_agent_id(full)
-            if decider_id and agent_id and decider_id != agent_id:
-                continue
+    def __init__(self):
+        negamax = SEARCH_ENGINE == "negamax"
+        self.table = new_transposition_table() if negamax else None
+        self.ordering = MoveOrdering() if negamax else None
+        self.vct = VctSolver() if VCT_ENABLED else None
+        self.ponderer = Ponderer(self.table) if PONDER_ENABLED and negamax else None
+        self.mcts = MctsSearch() if SEARCH_ENGINE == "mcts" else None
 
-            do_swap, detail = decide_swap(full, agent_id)
-            code, resp = post_swap(token, game_id, do_swap=do_swap)
-            if code == 200:
-                action = "swap" if do_swap else "no-swap"
-                print(
-                    f"[game:{game_id}] swap decision: {action}"
-                    f" keep={detail['keep']} swap={detail['swap']} diff={detail['diff']}"
-                )
-            elif code in (403, 409):
-                # Refresh immediately on stale/not-your-turn responses.
-                since_move = -1
-                since_updated_at = ""
-                since_revision = ""
-            elif code != 0:
-                print(f"[game:{game_id}] swap failed: {code} {resp}")
-            continue
 
-        if opening_state.get("awaiting_offer10_selection"):
-            selector_id = opening_state.get("tentative_white_agent_id")
-            if selector_id and agent_id and selector_id != agent_id:
-                continue
+def infer_agent_id(game, color_hint):
+    if color_hint == "black":
+        return game.get("black_agent_id")
+    if color_hint == "white":
+        return game.get("white_agent_id")
+    return None
 
-            chosen = choose_offer10_candidate(full, agent_id)
-            if chosen:
-                code, resp = post_offer10_select(token, game_id, chosen["x"], chosen["y"])
-                if code == 200:
-                    print(f"[game:{game_id}] offer10 selected ({chosen['x']},{chosen['y']})")
-                elif code in (403, 409):
-                    since_move = -1
-                    since_updated_at = ""
-                    since_revision = ""
-                elif code != 0:
-                    print(f"[game:{game_id}] offer10 select failed: {code} {resp}")
-            continue
 
-        if full.get("legal_moves"):
-            expected_mover_id = get_expected_mover_agent_id(full)
-            if expected_mover_id and agent_id and expected_mover_id != agent_id:
+def plan_turn(game, agent_id, state, clock=None):
+    """Decide what the agent owes in `game`: a swap, offer10 or move action, or None.
+
+    Pure computation (the CPU-heavy part of a turn); submit_turn sends the result.
+    """
+    opening_state = game.get("opening_state") or {}
+    if opening_state.get("awaiting_swap"):
+        decider_id = get_swap_decider_agent_id(game)
+        if decider_id and agent_id and decider_id != agent_id:
+            return None
+        do_swap, detail = decide_swap(game, agent_id)
+        return {"kind": "swap", "swap": do_swap, "detail": detail}
+
+    if opening_state.get("awaiting_offer10_selection"):
+        selector_id = opening_state.get("tentative_white_agent_id")
+        if selector_id and agent_id and selector_id != agent_id:
+            return None
+        chosen = choose_offer10_candidate(game, agent_id)
+        return {"kind": "offer10_select", "move": chosen} if chosen else None
+
+    if not game.get("legal_moves"):
+        return None
+    expected_mover_id = get_expected_mover_agent_id(game)
+    if expected_mover_id and agent_id and expected_mover_id != agent_id:
+        return None
+    if not agent_id:
+        # Avoid blind submissions when agent identity cannot be resolved.
+        return None
+
+    if opening_state.get("awaiting_offer10"):
+        proposer_id = opening_state.get("tentative_black_agent_id")
+        if proposer_id and proposer_id == agent_id:
+            do_offer10, candidates, detail = decide_offer10_proposal(game, agent_id)
+            if do_offer10 and candidates:
+                return {"kind": "offer10", "candidates": candidates, "detail": detail}
+
+    move = choose_move(
+        game,
+        table=state.table,
+        vct=state.vct,
+        ordering=state.ordering,
+        clock=clock,
+        ponder=state.ponderer,
+        mcts=state.mcts,
+    )
+    if not move:
+        return None
+    return {"kind": "move", "move": move, "turn_number": int(game.get("move_number", 0)) + 1}
+
+
+def submit_turn(token, game_id, action, http=http_json):
+    kind = action["kind"]
+    if kind == "swap":
+        return post_swap(token, game_id, do_swap=action["swap"], http=http)
+    if kind == "offer10_select":
+        return post_offer10_select(token, game_id, action["move"]["x"], action["move"]["y"], http=http)
+    if kind == "offer10":
+        return post_offer10(token, game_id, action["candidates"], http=http)
+    move = action["move"]
+    turn_number = action["turn_number"]
+    idem = f"{game_id}:{turn_number}:{move['x']}:{move['y']}"
+    return post_move(token, game_id, move["x"], move["y"], turn_number, idem, http=http)
+
+
+def report_turn(game_id, action, code, resp):
+    """Log a submitted action; True when the server says our view of the game is stale."""
+    kind = action["kind"]
+    if code == 200:
+        if kind == "swap":
+            detail = action["detail"]
+            print(
+                f"[game:{game_id}] swap decision: {'swap' if action['swap'] else 'no-swap'}"
+                f" keep={detail['keep']} swap={detail['swap']} diff={detail['diff']}"
+            )
+        elif kind == "offer10_select":
+            print(f"[game:{game_id}] offer10 selected ({action['move']['x']},{action['move']['y']})")
+        elif kind == "offer10":
+            detail = action["detail"]
+            print(
+                f"[game:{game_id}] offer10 proposed"
+                f" normal={detail.get('normal')} offer={detail.get('offer')}"
+                f" diff={detail.get('diff')}"
+            )
+        else:
+            move = action["move"]
+            print(f"[game:{game_id}] move {action['turn_number']}: ({move['x']},{move['y']})")
+        return False
+    # Stale/not-your-turn responses; a rejected offer10 or move means the same.
+    stale_codes = (403, 409) if kind in ("swap", "offer10_select") else (400, 403, 409)
+    if code in stale_codes:
+        return True
+    if code != 0:
+        label = {"swap": "swap", "offer10_select": "offer10 select", "offer10": "offer10 propose"}.get(kind, "move")
+        print(f"[game:{game_id}] {label} failed: {code} {resp}")
+    return False
+
+
+def log_game_end(game_id, game, state, mirror, scheduler=None, http_pool=HTTP_POOL):
+    print(f"[game:{game_id}] finished winner={game.get('winner_color')} reason={game.get('result_reason')}")
+    if state.table is not None:
+        print(f"[game:{game_id}] tt {json.dumps(state.table.stats(), sort_keys=True)}")
+        print(f"[game:{game_id}] ordering {json.dumps(state.ordering.stats(), sort_keys=True)}")
+    if state.ponderer is not None:
+        print(f"[game:{game_id}] ponder hits={state.ponderer.hits} misses={state.ponderer.misses}")
+    book = get_opening_book()
+    if book is not None:
+        print(f"[game:{game_id}] book {json.dumps(book.stats(), sort_keys=True)}")
+    print(f"[game:{game_id}] http {json.dumps(http_pool.stats(), sort_keys=True)}")
+    print(f"[game:{game_id}] mirror fetches={mirror.fetches} skipped={mirror.skipped}")
+    if scheduler is not None:
+        print(f"[game:{game_id}] polls {json.dumps(scheduler.stats(), sort_keys=True)}")
+
+
+class AgentSession:
+    """One agent's /agents/wait loop between games, shared by main() and agent_host.
+
+    Like GameSession, it only decides: callers send the requests and
+    sleep. on_wait() returns REGISTER when the key was rejected, RETRY
+    after sleeping `delay`, JOIN the queue, WAIT again, or PLAY the game
+    in `active`. `prefix` labels log lines when one process hosts many
+    agents.
+    """
+
+    REGISTER = "register"
+    RETRY = "retry"
+    JOIN = "join"
+    WAIT = "wait"
+    PLAY = "play"
+
+    def __init__(self, scheduler, prefix=""):
+        self.scheduler = scheduler
+        self.prefix = prefix
+        self.revision = ""
+        self.active = None
+        self.delay = 0.0
+
+    def on_wait(self, status, data):
+        if status == 401:
+            return self.REGISTER
+        self.scheduler.ok("auth")
+        if status != 200:
+            print(f"{self.prefix}agents-wait failed: {status} {data}")
+            self.delay = self.scheduler.fail("idle")
+            return self.RETRY
+        self.scheduler.ok("idle")
+
+        self.revision = str(data.get("revision", self.revision))
+        self.active = data.get("game")
+        if not self.active:
+            return self.WAIT if data.get("in_queue") else self.JOIN
+        self.scheduler.ok("queue")
+        active = self.active
+        print(f"{self.prefix}active game={active['id']} color={active.get('color')} phase={active.get('phase')}")
+        return self.PLAY
+
+    def registered(self):
+        """A new key replaced the rejected one: start over after the auth backoff."""
+        self.revision = ""
+        self.delay = self.scheduler.fail("auth")
+
+    def on_join(self, status, data):
+        if status not in (200, 409):
+            print(f"{self.prefix}queue join failed: {status} {data}")
+        elif status == 200 and data.get("game_id"):
+            print(f"{self.prefix}matched quickly game={data.get('game_id')}")
+        # Queue state is picked up by the /agents/wait revision; back off
+        # while joins keep coming back without a game.
+        self.delay = self.scheduler.fail("queue")
+
+    def game_over(self):
+        self.revision = ""
+
+
+class GameSession:
+    """One agent's progress through one game, shared by run_game_loop and agent_host.
+
+    Holds the /wait cursor (since_move, since_updated_at, since_revision),
+    the GameMirror, the search state and the PollScheduler, and makes every
+    decision of the game loop: whether to wait or refresh, what a wait or
+    fetch response means, when the full game is needed and how to back off
+    after a post. Callers only send the requests and sleep, so the blocking
+    daemon and the asyncio host follow a game the same way. The on_*()
+    methods return a step: LEAVE the game, RETRY after sleeping `delay`
+    seconds, SKIP to the next wait, or GO on.
+    """
+
+    LEAVE = "leave"
+    RETRY = "retry"
+    SKIP = "skip"
+    GO = "go"
+
+    def __init__(self, game, agent_id, scheduler=None):
+        self.game_id = game["id"]
+        self.color_hint = game.get("color")
+        self.agent_id = agent_id
+        self.since_move = -1
+        self.since_updated_at = ""
+        self.since_revision = ""
+        self.state = GameSearchState()
+        self.mirror = GameMirror()
+        self.scheduler = scheduler or PollScheduler()
+        self.scheduler.start_game(self.game_id)
+        self.refreshing = False
+        self.delay = 0.0
+
+    def wants_wait(self):
+        """False when a pending refresh (after a stale post) replaces the wait with one full fetch."""
+        self.refreshing = self.scheduler.take_refresh()
+        return not self.refreshing
+
+    def wait_args(self):
+        return self.game_id, self.since_move, self.since_updated_at, self.since_revision
+
+    def on_wait(self, status, waited):
+        if status == 404:
+            print(f"[game:{self.game_id}] no longer exists; leaving game loop")
+            return self.LEAVE
+        if status in (401, 403):
+            print(f"[game:{self.game_id}] wait unauthorized ({status}); leaving game loop")
+            return self.LEAVE
+        if status != 200 or not waited:
+            return self._retry("error")
+        self.scheduler.ok("error")
+
+        partial = waited.get("game") or {}
+        self.since_move = int(partial.get("move_number", self.since_move))
+        self.since_updated_at = str(partial.get("updated_at", self.since_updated_at))
+        self.since_revision = str(waited.get("revision", self.since_revision))
+        self.scheduler.at_move(self.since_move)
+
+        # The opponent's turns are followed from the wait payload alone; the
+        # full game (board, legal moves, offer10 candidates) is fetched only
+        # when we may have to act, and while pondering keeps running.
+        self.mirror.apply_wait(partial, self.since_revision)
+        if not self.mirror.should_act(self.agent_id):
+            self.mirror.skipped += 1
+            return self.SKIP
+        return self.GO
+
+    def needs_fetch(self):
+        return self.refreshing or not self.mirror.in_sync
+
+    def on_fetch(self, status, full):
+        if status == 404:
+            print(f"[game:{self.game_id}] state unavailable (404); leaving game loop")
+            return self.LEAVE
+        if status in (401, 403):
+            print(f"[game:{self.game_id}] game fetch unauthorized ({status}); leaving game loop")
+            return self.LEAVE
+        if status != 200 or not full:
+            if self.refreshing:
+                self.scheduler.refresh()
+            return self._retry("error")
+        self.scheduler.ok("error")
+        self.mirror.refresh(full)
+        # The next wait blocks until something changes after this snapshot. The
+        # server's revision stands unless the snapshot is newer than that wait;
+        # then it is rebuilt the way the server builds it from the wait row.
+        move_number = int(full.get("move_number", self.since_move))
+        updated_at = str(full.get("updated_at", self.since_updated_at))
+        if move_number != self.since_move or updated_at != self.since_updated_at:
+            self.since_move = move_number
+            self.since_updated_at = updated_at
+            self.since_revision = GameMirror.revision(full)
+            self.scheduler.at_move(self.since_move)
+        return self.GO
+
+    def game(self):
+        """The mirrored full game, inferring agent_id from it when unknown."""
+        full = self.mirror.game
+        if not self.agent_id:
+            self.agent_id = infer_agent_id(full, self.color_hint)
+            if self.agent_id:
+                print(f"[game:{self.game_id}] inferred agent_id={self.agent_id}")
+        return full
+
+    def on_post(self, action, code, resp):
+        self.mirror.invalidate()
+        if report_turn(self.game_id, action, code, resp):
+            # Stale/not-your-turn: refetch after a backoff that grows while it repeats.
+            self.scheduler.refresh()
+            return self._retry("stale")
+        if code == 0:
+            # The post may not have arrived; an unchanged game would hold the next wait.
+            self.scheduler.refresh()
+            return self._retry("error")
+        self.scheduler.ok("stale")
+        return self.GO
+
+    def should_ponder(self, action, code):
+        return self.state.ponderer is not None and code == 200 and action["kind"] == "move"
+
+    def log_end(self, game, http_pool=HTTP_POOL):
+        log_game_end(self.game_id, game, self.state, self.mirror, self.scheduler, http_pool)
+
+    def _retry(self, kind):
+        self.delay = self.scheduler.fail(kind)
+        return self.RETRY
+
+
+def run_game_loop(token, game, agent_id, scheduler=None):
+    session = GameSession(game, agent_id, scheduler)
+    game_id = session.game_id
+    ponderer = session.state.ponderer
+    http = session.scheduler.http
+
+    while True:
+        if session.wants_wait():
+            step = session.on_wait(*wait_game(*session.wait_args(), http=http))
+            if step == session.LEAVE:
+                if ponderer is not None:
+                    ponderer.stop()
+                return
+            if step == session.RETRY:
+                time.sleep(session.delay)
+            if step != session.GO:
                 continue
-            if not agent_id:
-                # Avoid blind submissions when agent identity cannot be resolved.
-                time.sleep(0.1)
+        if ponderer is not None:
+            ponderer.stop()
+        if session.needs_fetch():
+            step = session.on_fetch(*get_game(game_id, http=http))
+            if step == session.LEAVE:
+                return
+            if step == session.RETRY:
+                time.sleep(session.delay)
                 continue
+        full = session.game()
 
-            if opening_state.get("awaiting_offer10"):
-                proposer_id = opening_state.get("tentative_black_agent_id")
-                if proposer_id and proposer_id == agent_id:
-                    do_offer10, candidates, detail = decide_offer10_proposal(full, agent_id)
-                    if do_offer10 and candidates:
-                        code, resp = post_offer10(token, game_id, candidates)
-                        if code == 200:
-                            print(
-                                f"[game:{game_id}] offer10 proposed"
-                                f" normal={detail.get('normal')} offer={detail.get('offer')}"
-                                f" diff={detail.get('diff')}"
-                            )
-                        elif code in (400, 403, 409):
-                            since_move = -1
-                            since_updated_at = ""
-                            since_revision = ""
-                        elif code != 0:
-                            print(f"[game:{game_id}] offer10 propose failed: {code} {resp}")
-                        continue
+        if full.get("status") == "finished":
+            session.log_end(full)
+            return
 
-            move = choose_move(full)
-            if move:
-                turn_number = int(full.get("move_number", 0)) + 1
-                idem = f"{game_id}:{turn_number}:{move['x']}:{move['y']}"
-                code, resp = post_move(
-                    token,
-                    game_id,
-                    move["x"],
-                    move["y"],
-                    turn_number,
-                    idem,
-                )
-                if code == 200:
-                    print(f"[game:{game_id}] move {turn_number}: ({move['x']},{move['y']})")
-                elif code in (400, 403, 409):
-                    since_move = -1
-                    since_updated_at = ""
-                    since_revision = ""
-                    time.sleep(0.05)
-                elif code != 0:
-                    print(f"[game:{game_id}] move failed: {code} {resp}")
+        action = plan_turn(full, session.agent_id, session.state)
+        if action is None:
             continue
+        code, resp = submit_turn(token, game_id, action, http=http)
+        if session.on_post(action, code, resp) == session.RETRY:
+            time.sleep(session.delay)
+        elif session.should_ponder(action, code):
+            start_pondering(ponderer, full, action["move"])
 
 
 def main():
+    # Fork the search workers and map the opening book up front so the first
+    # move does not pay for them.
+    get_root_pool()
+    book = get_opening_book()
+    if book is not None:
+        print(f"opening book: {book.count} positions")
+    # Every request below goes through the scheduler's budget and counters.
+    scheduler = PollScheduler()
+    http = scheduler.http
     saved_token, saved_agent_id = load_saved_credentials()
     token = AGENT_API_KEY or saved_token
     agent_id = str(os.getenv("AGENT_ID", "")).strip() or saved_agent_id
     if not token:
         try:
-            token, agent_id = register_agent(AGENT_NAME)
+            token, agent_id = register_agent(AGENT_NAME, http=http)
         except RuntimeError as e:
             print(f"{e}")
             print("name may already exist. choose another AGENT_NAME.")
@@ -1041,83 +3946,71 @@ def main():
         save_token(token, agent_id)
         print(f"registered agent={agent_id} api_key={token}")
     elif not agent_id:
-        me_status, me_data = get_me(token)
+        me_status, me_data = get_me(token, http=http)
         if me_status == 200 and me_data.get("id"):
             agent_id = str(me_data.get("id"))
             save_token(token, agent_id)
 
-    agent_revision = ""
+    session = AgentSession(scheduler)
     while True:
-        wait_status, wait_data = wait_agent_state(token, agent_revision)
-
-        if wait_status == 401:
-            try:
-                token, agent_id = register_agent(AGENT_NAME)
-            except RuntimeError as e:
-                print(f"{e}")
-                print("stored key invalid and name is not reusable. set another AGENT_NAME.")
-                return
-            save_token(token, agent_id)
-            print(f"token refreshed via re-register agent={agent_id}")
-            agent_revision = ""
-            time.sleep(0.5)
-            continue
+        wait_status, wait_data = wait_agent_state(token, session.revision, http=http)
 
         # Backward compatibility: older servers may not provide /agents/wait yet.
         if wait_status == 404:
-            status, active, raw = get_active_game(token)
+            scheduler.ok("auth")
+            status, active, raw = get_active_game(token, http=http)
             if status == 401:
                 try:
-                    token, agent_id = register_agent(AGENT_NAME)
+                    token, agent_id = register_agent(AGENT_NAME, http=http)
                 except RuntimeError as e:
                     print(f"{e}")
                     print("stored key invalid and name is not reusable. set another AGENT_NAME.")
                     return
                 save_token(token, agent_id)
                 print(f"token refreshed via re-register agent={agent_id}")
-                agent_revision = ""
+                session.revision = ""
                 continue
             if status != 200:
                 print(f"active-game failed: {status} {raw}")
-                time.sleep(IDLE_SLEEP)
+                time.sleep(scheduler.fail("idle"))
                 continue
+            scheduler.ok("idle")
             if not active:
-                status, data = join_queue(token)
+                status, data = join_queue(token, http=http)
                 if status not in (200, 409):
                     print(f"queue join failed: {status} {data}")
                 time.sleep(IDLE_SLEEP)
                 continue
             print(f"active game={active['id']} color={active.get('color')} phase={active.get('phase')}")
-            run_game_loop(token, active, agent_id)
+            run_game_loop(token, active, agent_id, scheduler)
             if EXIT_AFTER_GAME:
                 return
             continue
 
-        if wait_status != 200:
-            print(f"agents-wait failed: {wait_status} {wait_data}")
-            time.sleep(IDLE_SLEEP)
+        step = session.on_wait(wait_status, wait_data)
+        if step == session.REGISTER:
+            try:
+                token, agent_id = register_agent(AGENT_NAME, http=http)
+            except RuntimeError as e:
+                print(f"{e}")
+                print("stored key invalid and name is not reusable. set another AGENT_NAME.")
+                return
+            save_token(token, agent_id)
+            print(f"token refreshed via re-register agent={agent_id}")
+            session.registered()
+            time.sleep(session.delay)
             continue
-
-        agent_revision = str(wait_data.get("revision", agent_revision))
-        active = wait_data.get("game")
-        in_queue = bool(wait_data.get("in_queue"))
-
-        if not active:
-            if not in_queue:
-                status, data = join_queue(token)
-                if status not in (200, 409):
-                    print(f"queue join failed: {status} {data}")
-                elif status == 200 and data.get("game_id"):
-                    print(f"matched quickly game={data.get('game_id')}")
-                # queue state will be picked up by /agents/wait revision on next loop
-                time.sleep(0.2)
+        if step == session.JOIN:
+            session.on_join(*join_queue(token, http=http))
+        if step in (session.RETRY, session.JOIN):
+            time.sleep(session.delay)
+        if step != session.PLAY:
             continue
 
-        print(f"active game={active['id']} color={active.get('color')} phase={active.get('phase')}")
-        run_game_loop(token, active, agent_id)
+        run_game_loop(token, session.active, agent_id, scheduler)
         if EXIT_AFTER_GAME:
             return
-        agent_revision = ""
+        session.game_over()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,458 @@
+"""Checks for daemon_agent.py against the arena API's payload shapes.
+
+Run with `python -m pytest agents` or `python -m unittest discover agents`.
+"""
+
+import copy
+import multiprocessing
+import os
+import random
+import tempfile
+import unittest
+
+os.environ.setdefault("AGENT_DETERMINISTIC", "1")
+os.environ["OPENING_BOOK_PATH"] = ""
+
+import daemon_agent as agent  # noqa: E402
+
+# The columns GET /games/:id/wait selects (apps/api/src/index.ts); no player ids.
+WAIT_COLUMNS = ("id", "status", "phase", "move_number", "turn_color", "turn_deadline_at", "updated_at", "opening_state")
+BLACK_ID = "agent-black"
+WHITE_ID = "agent-white"
+
+
+def games_row(move_number, turn_color, swaps=0, awaiting_swap=False):
+    """A games table row as the API reads it, after `move_number` stones."""
+    return {
+        "id": "game-1",
+        "status": "active",
+        "phase": "opening" if move_number <= 5 else "midgame",
+        "move_number": move_number,
+        "turn_color": turn_color,
+        "turn_deadline_at": f"2026-10-17T10:00:{move_number:02d}+00:00",
+        "updated_at": f"2026-10-17T09:59:{move_number:02d}+00:00",
+        "black_agent_id": BLACK_ID,
+        "white_agent_id": WHITE_ID,
+        "opening_state": {
+            "tentative_black_agent_id": BLACK_ID,
+            "tentative_white_agent_id": WHITE_ID,
+            "awaiting_swap": awaiting_swap,
+            "swap_after_move": move_number if awaiting_swap else None,
+            "swap_history": [{"after_move": n + 1, "swapped": False} for n in range(swaps)],
+            "awaiting_offer10_selection": False,
+            "offer10_id": None,
+        },
+    }
+
+
+def full_game(row):
+    """GET /games/:id for `row`: the row plus player ids, board and derived opening fields."""
+    game = copy.deepcopy(row)
+    game["board"] = [[None] * agent.BOARD_SIZE for _ in range(agent.BOARD_SIZE)]
+    for n in range(row["move_number"]):
+        game["board"][n][0] = "black" if n % 2 == 0 else "white"
+    game["legal_moves"] = [{"x": 7, "y": 7}]
+    opening_state = game["opening_state"]
+    opening_state["awaiting_offer10"] = (
+        row["move_number"] == 4 and not opening_state["awaiting_swap"] and not opening_state["awaiting_offer10_selection"]
+    )
+    return game
+
+
+def board_with(black=(), white=()):
+    """A Board holding stones at the given (x, y) cells."""
+    board = agent.Board()
+    for stone, cells in ((agent.BLACK, black), (agent.WHITE, white)):
+        for x, y in cells:
+            board.make(agent.cell_index(x, y), stone)
+    return board
+
+
+def cells(*coords):
+    return [agent.cell_index(x, y) for x, y in coords]
+
+
+def rows_of(board):
+    """The GET /games/:id board rows holding `board`'s stones."""
+    rows = [[None] * agent.BOARD_SIZE for _ in range(agent.BOARD_SIZE)]
+    for idx in board.history:
+        x, y = agent.cell_coords(idx)
+        rows[y][x] = "black" if board.cells[idx] == agent.BLACK else "white"
+    return rows
+
+
+def store_shared(path, entries):
+    """Store (key, depth, score, bound, move) entries from another process."""
+    table = agent.SharedTranspositionTable(path, megabytes=1)
+    table.new_search()
+    for entry in entries:
+        table.store(*entry)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FixedJitter:
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+
+def wait_payload(row, revision):
+    return {"changed": True, "revision": revision, "game": {column: copy.deepcopy(row[column]) for column in WAIT_COLUMNS}}
+
+
+class BoardTest(unittest.TestCase):
+    def assert_matches_rebuild(self, board):
+        rebuilt = agent.Board.from_rows(rows_of(board))
+        self.assertEqual(board.hash, rebuilt.hash)
+        self.assertEqual(board.forbidden, rebuilt.forbidden)
+        self.assertEqual(board.near1, rebuilt.near1)
+        self.assertEqual(board.near2, rebuilt.near2)
+        for stone in (agent.BLACK, agent.WHITE):
+            self.assertEqual(board.patterns[stone], rebuilt.patterns[stone])
+            self.assertEqual(board.wins[stone], rebuilt.wins[stone])
+            self.assertEqual(board.fours[stone], rebuilt.fours[stone])
+        # The indexes also agree with the per-cell rules they cache.
+        empty = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+        status = {idx: agent.black_move_status(board, idx) for idx in empty}
+        self.assertEqual(board.forbidden, {idx for idx in empty if status[idx][0]})
+        self.assertEqual(board.wins[agent.BLACK], {idx for idx in empty if not status[idx][0] and status[idx][1]})
+        self.assertEqual(board.fours[agent.BLACK], {idx for idx in empty if not status[idx][0] and status[idx][2]})
+        self.assertEqual(board.wins[agent.WHITE], {idx for idx in empty if agent.is_winning_move(board, idx, agent.WHITE)})
+        self.assertEqual(board.fours[agent.WHITE], {idx for idx in empty if agent.makes_four(board, idx, agent.WHITE)})
+
+    def test_make_unmake_matches_rebuild(self):
+        rng = random.Random(1)
+        for _ in range(8):
+            board = agent.Board()
+            stone = agent.BLACK
+            for _ in range(100):
+                if board.history and rng.random() < 0.3:
+                    board.unmake()
+                else:
+                    empty = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+                    board.make(rng.choice(empty), stone)
+                stone = agent.other_stone(stone)
+                self.assert_matches_rebuild(board)
+            while board.history:
+                board.unmake()
+            self.assertEqual(board.hash, 0)
+            self.assertEqual(board.patterns, agent.Board().patterns)
+
+
+class RenjuRulesTest(unittest.TestCase):
+    # Every position is judged at (7,7), against evaluateMove in packages/shared/src/renju.ts.
+    CENTER = agent.cell_index(7, 7)
+
+    def assert_forbidden(self, board, reason):
+        self.assertEqual(agent.forbidden_reason(board, self.CENTER), reason)
+        self.assertEqual(agent.black_move_status(board, self.CENTER), (reason, False, False))
+        self.assertIn(self.CENTER, board.forbidden)
+        self.assertNotIn(self.CENTER, board.wins[agent.BLACK])
+        self.assertNotIn(self.CENTER, board.fours[agent.BLACK])
+        self.assertEqual(agent.drop_forbidden(board, [self.CENTER], agent.BLACK), [])
+
+    def test_overline(self):
+        board = board_with(black=[(4, 7), (5, 7), (6, 7), (8, 7), (9, 7)])
+        self.assert_forbidden(board, "overline")
+
+    def test_double_four(self):
+        board = board_with(black=[(4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6)])
+        self.assert_forbidden(board, "double_four")
+
+    def test_exact_five_with_double_four_is_forbidden(self):
+        # renju.ts checks the forbidden shapes before the five, so the five does not save it.
+        board = board_with(black=[(3, 7), (4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6), (4, 4), (5, 5), (6, 6)])
+        self.assert_forbidden(board, "double_four")
+        # The other end of the row is a plain exact five.
+        self.assertIn(agent.cell_index(2, 7), board.wins[agent.BLACK])
+
+    def test_exact_five_with_one_four_wins(self):
+        board = board_with(black=[(3, 7), (4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6)], white=[(7, 3)])
+        self.assertEqual(agent.black_move_status(board, self.CENTER), (None, True, True))
+        self.assertIn(self.CENTER, board.wins[agent.BLACK])
+        self.assertNotIn(self.CENTER, board.forbidden)
+
+    def test_white_five_or_more_wins(self):
+        board = board_with(white=[(4, 7), (5, 7), (6, 7), (8, 7), (9, 7)])
+        self.assertTrue(agent.is_winning_move(board, self.CENTER, agent.WHITE))
+        self.assertIn(self.CENTER, board.wins[agent.WHITE])
+        self.assertNotIn(self.CENTER, board.forbidden)
+        board = board_with(white=[(3, 7), (4, 7), (5, 7), (6, 7)])
+        self.assertIn(self.CENTER, board.wins[agent.WHITE])
+
+    def test_forcing_threats_skip_forbidden_black_cells(self):
+        # (7,7) would give black two fours, a fork, but it is a double four.
+        board = board_with(black=[(4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6)], white=[(3, 7), (7, 3)])
+        self.assertIn(self.CENTER, board.forbidden)
+        empty = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+        threats = agent.find_forcing_threats(board, agent.BLACK, empty, max_found=len(empty))
+        self.assertNotIn(self.CENTER, threats)
+        self.assertFalse(threats & board.forbidden)
+        # The same shape is a fork for white, which has no forbidden moves.
+        board = board_with(white=[(4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6)], black=[(3, 7), (7, 3)])
+        empty = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+        self.assertIn(self.CENTER, agent.find_forcing_threats(board, agent.WHITE, empty, max_found=len(empty)))
+
+
+class SolverTest(unittest.TestCase):
+    def assert_legal_line(self, board, line, attacker):
+        """Play `line` move by move, checking each is legal and forced, then undo it."""
+        defender = agent.other_stone(attacker)
+        played = 0
+        for i, idx in enumerate(line):
+            self.assertEqual(board.cells[idx], agent.EMPTY)
+            if i % 2 == 0:
+                if attacker == agent.BLACK:
+                    self.assertNotIn(idx, board.forbidden)
+                self.assertTrue(idx in board.wins[attacker] or idx in board.fours[attacker])
+                board.make(idx, attacker)
+                played += 1
+                continue
+            # The defender's reply is a block of the four just made.
+            self.assertIn(idx, board.wins[attacker])
+            if i == len(line) - 1:
+                # The last block does not hold: a double four, or illegal for black.
+                self.assertTrue(len(board.wins[attacker]) >= 2 or idx in board.forbidden)
+                break
+            self.assertEqual(board.wins[attacker], {idx})
+            if defender == agent.BLACK:
+                self.assertNotIn(idx, board.forbidden)
+            board.make(idx, defender)
+            played += 1
+        else:
+            self.assertEqual(len(line) % 2, 1)
+            self.assertTrue(agent.is_win_after_placing(board, line[-1], attacker))
+        for _ in range(played):
+            board.unmake()
+
+    def test_vcf_win(self):
+        # (8,8) fours the row, (8,9) then makes a column double four.
+        board = board_with(
+            black=[(4, 5), (4, 8), (8, 4)],
+            white=[(5, 5), (6, 5), (7, 5), (8, 6), (8, 7), (5, 8), (6, 8), (7, 8)],
+        )
+        solver = agent.VcfSolver()
+        line = solver.solve(board, agent.WHITE)
+        self.assertIsNotNone(line)
+        self.assertGreaterEqual(len(line), 4)
+        self.assert_legal_line(board, line, agent.WHITE)
+
+    def test_vcf_refuted(self):
+        # Black closed one end: every four is blocked and nothing follows.
+        board = board_with(black=[(4, 7)], white=[(5, 7), (6, 7), (7, 7)])
+        solver = agent.VcfSolver()
+        self.assertIsNone(solver.solve(board, agent.WHITE))
+        self.assertFalse(solver.exhausted)
+
+    def test_vcf_defenses_refute_the_line(self):
+        board = board_with(
+            black=[(4, 7), (5, 7), (6, 7), (8, 7), (9, 7), (7, 6), (7, 12)],
+            white=[(7, 8), (7, 9), (7, 10), (1, 1), (13, 13), (1, 13), (13, 1)],
+        )
+        solver = agent.VcfSolver()
+        line = solver.solve(board, agent.WHITE)
+        empty = [idx for idx in agent.BOARD_INDICES if board.cells[idx] == agent.EMPTY]
+        legal = agent.drop_forbidden(board, empty, agent.BLACK)
+        defenses = agent.find_vcf_defenses(board, agent.BLACK, legal, solver, line)
+        # Taking (7,11) first, or fouring with tempo; (7,7) is forbidden.
+        self.assertEqual(defenses, cells((2, 7), (3, 7), (7, 11)))
+        for idx in defenses:
+            board.make(idx, agent.BLACK)
+            self.assertIsNone(agent.VcfSolver().solve(board, agent.WHITE))
+            board.unmake()
+
+    def test_vcf_through_forbidden_block(self):
+        # (7,7) would give black an overline, so the four from (7,11) cannot be blocked.
+        board = board_with(
+            black=[(4, 7), (5, 7), (6, 7), (8, 7), (9, 7), (7, 6), (7, 12)],
+            white=[(7, 8), (7, 9), (7, 10), (1, 1), (13, 13), (1, 13), (13, 1)],
+        )
+        self.assertEqual(agent.forbidden_reason(board, agent.cell_index(7, 7)), "overline")
+        line = agent.VcfSolver().solve(board, agent.WHITE)
+        self.assertEqual(line, cells((7, 11), (7, 7)))
+        self.assert_legal_line(board, line, agent.WHITE)
+
+    def test_vct_win_within_node_cap(self):
+        # (8,7) makes two open threes; no single reply stops both.
+        board = board_with(black=[(2, 2), (12, 12)], white=[(6, 7), (7, 7), (8, 5), (8, 6)])
+        self.assertIsNone(agent.VcfSolver().solve(board, agent.WHITE))
+        solver = agent.VctSolver(max_nodes=2000, time_ms=60000)
+        idx = solver.solve(board, agent.WHITE)
+        self.assertEqual(idx, agent.cell_index(8, 7))
+        self.assertFalse(solver.exhausted)
+        self.assertLess(solver.nodes, solver.max_nodes)
+        self.assertEqual(board.cells[idx], agent.EMPTY)
+
+
+class SharedTranspositionTableTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "tt.bin")
+
+    def test_empty_slot_is_not_a_hit_for_key_zero(self):
+        table = agent.SharedTranspositionTable(self.path, megabytes=1)
+        self.assertIsNone(table.probe(0))
+        self.assertEqual(table.hits, 0)
+
+    def test_entries_are_shared_between_processes(self):
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        entries = [(0, 3, -120, 1, 42), (0xDEADBEEF12345678, 5, 77, 2, None)]
+        process = ctx.Process(target=store_shared, args=(self.path, entries))
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        table = agent.SharedTranspositionTable(self.path, megabytes=1)
+        for key, depth, score, bound, move in entries:
+            slot = (key & table.mask) << 1
+            self.assertEqual(table.words[slot] ^ table.words[slot + 1], key)
+            self.assertEqual(table.probe(key)[:5], (key, depth, score, bound, move))
+        self.assertIsNone(table.probe(1 << 40))
+
+
+class OpeningBookTest(unittest.TestCase):
+    def test_lookup_maps_moves_back_for_every_symmetry(self):
+        # An asymmetric position, so all eight images are distinct boards.
+        stones = list(zip(cells((7, 7), (8, 6), (9, 8)), (agent.BLACK, agent.WHITE, agent.BLACK)))
+        board = agent.Board()
+        for idx, stone in stones:
+            board.make(idx, stone)
+        moves = cells((6, 5), (10, 9), (7, 9))
+        entries = [
+            agent.OpeningBook.entry(board, agent.BOOK_MOVE, agent.WHITE, moves, (30, 20, 10)),
+            agent.OpeningBook.entry(board, agent.BOOK_SWAP, agent.WHITE, (), (5, -5)),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            self.assertEqual(agent.OpeningBook.write(path, entries), 2)
+            book = agent.OpeningBook(path)
+            images = set()
+            for mapping in agent.SYMMETRY_MAPS:
+                image = agent.Board()
+                for idx, stone in stones:
+                    image.make(mapping[idx], stone)
+                images.add(tuple(image.cells))
+                found, scores = book.lookup(image, agent.BOOK_MOVE, agent.WHITE)
+                self.assertEqual(found, [mapping[idx] for idx in moves])
+                self.assertEqual(scores[:4], (30, 20, 10, 0))
+                self.assertEqual(book.lookup(image, agent.BOOK_SWAP, agent.WHITE)[1][:2], (5, -5))
+                self.assertIsNone(book.lookup(image, agent.BOOK_MOVE, agent.BLACK))
+            self.assertEqual(len(images), 8)
+            self.assertIsNone(book.lookup(agent.Board(), agent.BOOK_MOVE, agent.BLACK))
+            self.assertEqual(book.stats(), {"records": 2, "hits": 16, "misses": 9})
+            book.map.close()
+
+
+class PollSchedulerTest(unittest.TestCase):
+    def test_budget_caps_the_request_rate(self):
+        clock = FakeClock()
+        scheduler = agent.PollScheduler(rpm=60, burst=3, clock=clock)
+        self.assertEqual([scheduler.admit("GET /x") for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertEqual(scheduler.admit("GET /x"), 1.0)
+        self.assertEqual(scheduler.admit("GET /x"), 2.0)
+        # Sleeping as told sends one request a second past the burst: with the
+        # two above still owed, the 100th more goes out 102 seconds later.
+        started = clock.now
+        for _ in range(100):
+            clock.now += scheduler.admit("GET /x")
+        self.assertAlmostEqual(clock.now - started, 102.0)
+        clock.now += 3600.0
+        # An idle hour refills the bucket to the burst, not beyond it.
+        self.assertEqual([scheduler.admit("GET /x") for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertEqual(scheduler.admit("GET /x"), 1.0)
+
+    def test_zero_rate_is_unlimited(self):
+        scheduler = agent.PollScheduler(rpm=0, burst=1, clock=FakeClock())
+        self.assertEqual([scheduler.admit("GET /x") for _ in range(50)], [0.0] * 50)
+
+    def test_backoff_doubles_up_to_the_ceiling(self):
+        scheduler = agent.PollScheduler(backoff_max=30, rng=FixedJitter(1.0))
+        self.assertEqual([scheduler.fail("error") for _ in range(8)], [1, 2, 4, 8, 16, 30, 30, 30])
+        # Jitter takes off at most half.
+        scheduler = agent.PollScheduler(backoff_max=30, rng=FixedJitter(0.0))
+        self.assertEqual([scheduler.fail("error") for _ in range(7)], [0.5, 1, 2, 4, 8, 15, 15])
+
+    def test_success_resets_only_its_kind(self):
+        scheduler = agent.PollScheduler(backoff_max=30, rng=FixedJitter(1.0))
+        for _ in range(4):
+            scheduler.fail("error")
+            scheduler.fail("stale")
+        scheduler.ok("error")
+        self.assertEqual(scheduler.fail("error"), 1.0)
+        self.assertEqual(scheduler.fail("stale"), 0.8)
+
+    def test_refreshes_coalesce_into_one_fetch(self):
+        session = agent.GameSession({"id": "game-1"}, BLACK_ID, agent.PollScheduler(rng=FixedJitter(1.0)))
+        move = {"kind": "move", "move": {"x": 7, "y": 7}, "turn_number": 7}
+        # A stale post and a lost post both ask for the game before the next wait.
+        self.assertEqual(session.on_post(move, 409, {"error": "not your turn"}), session.RETRY)
+        self.assertEqual(session.on_post(move, 0, {"error": "timed out"}), session.RETRY)
+        self.assertFalse(session.wants_wait())
+        self.assertTrue(session.needs_fetch())
+        self.assertEqual(session.on_fetch(200, full_game(games_row(6, "black"))), session.GO)
+        self.assertTrue(session.wants_wait())
+        self.assertEqual(session.scheduler.stats()["coalesced"], 1)
+
+
+class GameMirrorTest(unittest.TestCase):
+    def test_revision_of_full_game_matches_wait_revision(self):
+        # waitRevisionForGame on the wait row: player ids are blank.
+        row = games_row(8, "black", swaps=2)
+        expected = "active|midgame|8|black|2026-10-17T10:00:08+00:00|2026-10-17T09:59:08+00:00|||0||0||2"
+        self.assertEqual(agent.GameMirror.revision(full_game(row)), expected)
+
+    def test_wait_after_own_move_keeps_mirror(self):
+        mirror = agent.GameMirror()
+        mirror.refresh(full_game(games_row(6, "black", swaps=2)))
+        mirror.invalidate()
+        row = games_row(7, "white", swaps=2)
+        waited = wait_payload(row, "active|midgame|7|white|2026-10-17T10:00:07+00:00|2026-10-17T09:59:07+00:00|||0||0||2")
+        mirror.apply_wait(waited["game"], waited["revision"])
+        self.assertIsNotNone(mirror.game)
+        self.assertFalse(mirror.should_act(BLACK_ID))
+        self.assertTrue(mirror.should_act(WHITE_ID))
+
+    def test_wait_with_wrong_revision_drops_mirror(self):
+        mirror = agent.GameMirror()
+        mirror.refresh(full_game(games_row(6, "black")))
+        row = games_row(7, "white")
+        waited = wait_payload(row, "active|midgame|7|white|2026-10-17T10:00:07+00:00|2026-10-17T09:59:07+00:00|||1|7|0||0")
+        mirror.apply_wait(waited["game"], waited["revision"])
+        self.assertIsNone(mirror.game)
+
+    def test_swap_drops_mirror(self):
+        mirror = agent.GameMirror()
+        mirror.refresh(full_game(games_row(3, "white", swaps=2, awaiting_swap=True)))
+        row = games_row(3, "white", swaps=3)
+        waited = wait_payload(row, agent.GameMirror.revision(row))
+        mirror.apply_wait(waited["game"], waited["revision"])
+        self.assertIsNone(mirror.game)
+        self.assertTrue(mirror.should_act(BLACK_ID))
+
+    def test_automation_row_with_player_ids_keeps_mirror(self):
+        # A timeout or auto swap hands the wait handler a full row, ids included.
+        mirror = agent.GameMirror()
+        mirror.refresh(full_game(games_row(10, "black")))
+        row = games_row(11, "white")
+        waited = {
+            "changed": True,
+            "revision": f"active|midgame|11|white|2026-10-17T10:00:11+00:00|2026-10-17T09:59:11+00:00|{BLACK_ID}|{WHITE_ID}|0||0||0",
+            "game": copy.deepcopy(row),
+        }
+        mirror.apply_wait(waited["game"], waited["revision"])
+        self.assertIsNotNone(mirror.game)
+        self.assertFalse(mirror.should_act(BLACK_ID))
+
+
+if __name__ == "__main__":
+    unittest.main()